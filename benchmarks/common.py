@@ -0,0 +1,76 @@
+"""Shared helpers for the benchmark scripts."""
+from __future__ import annotations
+
+import copy
+import math
+import random
+import statistics
+from typing import Dict, List, Sequence
+
+from game import entity_factories
+from game.engine import Engine
+from game.game_map import GameWorld
+
+
+class BenchMeta:
+    """Stands in for setup_game.Meta so benchmarks never touch the player's settings file."""
+    version = "bench"
+    difficulty = "easy"
+    tutorials = False
+    tutorial_events: List[str] = []
+    do_combat_confirm = False
+    fullscreen = False
+
+    def log_run(self, history) -> None:
+        pass
+
+
+def new_engine(map_width: int = 57, map_height: int = 50) -> Engine:
+    """Return an Engine with a world but no floor yet, like setup_game.new_game."""
+    player = copy.deepcopy(entity_factories.player)
+    player.id = 0
+
+    engine = Engine(player=player, meta=BenchMeta())
+    engine.turn_count = 240
+    engine.game_world = GameWorld(
+        engine=engine,
+        map_width=map_width,
+        map_height=map_height,
+        game_mode='default'
+    )
+    return engine
+
+
+def new_game(seed: int, map_width: int = 57, map_height: int = 50) -> Engine:
+    """Return a seeded Engine with its first floor generated."""
+    random.seed(seed)
+    engine = new_engine(map_width, map_height)
+    engine.game_world.generate_floor()
+    engine.update_fov()
+    return engine
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """Nearest-rank percentile of `values`."""
+    ordered = sorted(values)
+    rank = max(math.ceil(p / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def summarize(values: Sequence[float]) -> Dict[str, float]:
+    return {
+        "mean": statistics.mean(values),
+        "min": min(values),
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+def distribution(values: Sequence[int]) -> Dict[str, object]:
+    """Summary stats plus a value -> count histogram."""
+    histogram: Dict[str, int] = {}
+    for v in sorted(values):
+        histogram[str(v)] = histogram.get(str(v), 0) + 1
+    return dict(summarize(values), histogram=histogram)
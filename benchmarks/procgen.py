@@ -0,0 +1,85 @@
+"""Benchmark level generation over a range of seeds and map sizes.
+
+Usage: python -m benchmarks.procgen [--seeds N] [--first-seed S] [--sizes 57x50,80x60]
+
+Prints a JSON report to stdout so runs can be diffed across versions.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import warnings
+
+from game.procgen import generate_dungeon
+from game.setup_game import Meta
+
+from benchmarks.common import distribution, new_engine, summarize
+
+
+def bench_size(map_width: int, map_height: int, seeds) -> dict:
+    latencies = []
+    samples = {
+        "retries": [],
+        "room_count": [],
+        "main_room_count": [],
+        "closet_count": [],
+        "shuttle_attempts": [],
+        "npc_count": [],
+    }
+
+    for seed in seeds:
+        random.seed(seed)
+        engine = new_engine(map_width, map_height)
+        stats = {}
+
+        start = time.perf_counter()
+        generate_dungeon(
+            floor_number=1,
+            map_width=map_width,
+            map_height=map_height,
+            engine=engine,
+            game_mode='default',
+            items=[],
+            stats=stats
+        )
+        latencies.append(time.perf_counter() - start)
+
+        for k in samples:
+            samples[k].append(stats[k])
+
+    return {
+        "map_size": [map_width, map_height],
+        "layouts": len(latencies),
+        "layouts_per_sec": len(latencies) / sum(latencies),
+        "latency_sec": summarize(latencies),
+        **{k: distribution(v) for k, v in samples.items()},
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seeds", type=int, default=50, help="number of seeds per map size")
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--sizes", default="57x50", help="comma separated WIDTHxHEIGHT list")
+    args = parser.parse_args(argv)
+
+    sizes = [tuple(int(n) for n in s.split("x")) for s in args.sizes.split(",")]
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+
+    report = {
+        "version": Meta.version,
+        "python": platform.python_version(),
+        "seeds": [seeds.start, seeds.stop],
+        "results": [bench_size(w, h, seeds) for w, h in sizes],
+    }
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+    main()
@@ -0,0 +1,133 @@
+"""Benchmark per-frame rendering cost against long runs.
+
+Usage: python -m benchmarks.render [--npcs 0,300] [--messages 100,10000] [--frames F]
+
+Times the right-hand HUD, a whole game frame, one under the pause menu and
+a help page, and GameMap.render with --npcs extra NPCs crowded onto the
+floor. Then fills a game's message log with --messages messages, a few per
+turn, and times MessageLog.render, the stat screen's full-log render,
+building the message history's line index and paging through it. Prints
+a JSON report to stdout.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import warnings
+
+import tcod
+
+from game import color, render_functions
+from game.setup_game import Meta
+from game.input_handlers import HelpMenuHandler, HistoryViewer, MainGameEventHandler, PlayMenuHandler
+
+from benchmarks.common import new_game, summarize
+
+
+def fill_log(engine, count: int) -> None:
+    log = engine.message_log
+    for i in range(count):
+        engine.turn_count = 240 + i // 3
+        if i % 2:
+            log.add_message(f"Message {i} about something that happened (?) this turn.", color.offwhite, "+1 vigor", color.changeling)
+        else:
+            log.add_message(f"Message {i} about something else that happened this turn.", color.grey)
+
+
+def time_frames(render, frames: int) -> dict:
+    times = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        render()
+        times.append(time.perf_counter() - start)
+    return summarize(times)
+
+
+def bench_frame(frames: int) -> dict:
+    engine = new_game(0)
+    player = engine.player
+    console = tcod.Console(80, 50, order="F")
+
+    def frame(handler):
+        console.clear()
+        handler.on_render(console)
+
+    menu = PlayMenuHandler(engine, MainGameEventHandler(engine))
+    help_menu = HelpMenuHandler(engine)
+    return {
+        "hud_sec": time_frames(lambda: render_functions.render_run_info(console, engine.turn_count, player), frames),
+        "frame_sec": time_frames(lambda: frame(MainGameEventHandler(engine)), frames),
+        "menu_frame_sec": time_frames(lambda: frame(menu), frames),
+        "help_frame_sec": time_frames(lambda: frame(help_menu), frames),
+    }
+
+
+def bench_map(npcs: int, frames: int) -> dict:
+    engine = new_game(0)
+    gm = engine.game_map
+    template = next(a for a in gm.actors if a is not engine.player)
+    floor = [tuple(xy) for xy in zip(*gm.tiles["walkable"].nonzero())]
+    rng = random.Random(0)
+    for xy in rng.sample(floor, min(npcs, len(floor))):
+        template.instantiate(gm, *xy, template.name, template.schedule)
+    # half the map in view, so every visibility case is exercised
+    gm.visible[:, ::2] = True
+    gm.explored[:] = True
+
+    console = tcod.Console(80, 50, order="F")
+    return {
+        "entities": len(gm.entities),
+        "map_sec": time_frames(lambda: gm.render(console), frames),
+    }
+
+
+def bench_messages(count: int, frames: int) -> dict:
+    engine = new_game(0)
+    fill_log(engine, count)
+    log = engine.message_log
+    console = tcod.Console(80, 50, order="F")
+
+    start = time.perf_counter()
+    log.messages.line_ends(72)
+    index = time.perf_counter() - start
+
+    viewer = HistoryViewer(engine)
+
+    def page_up():
+        viewer.page(-1)
+        log.render_messages(console, 1, 1, 72, 42, log.messages, False, stop=viewer.cursor + 1)
+
+    return {
+        "messages": count,
+        "log_sec": time_frames(lambda: log.render(console, 0, 0, 0, 0), frames),
+        "stat_screen_sec": time_frames(lambda: log.render_messages(console, 41, 2, 36, 46, log.messages, False), frames),
+        "history_index_sec": index,
+        "history_page_sec": time_frames(page_up, frames),
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--npcs", default="0,300", help="comma separated extra NPC counts")
+    parser.add_argument("--messages", default="100,10000", help="comma separated message log lengths")
+    parser.add_argument("--frames", type=int, default=200, help="frames timed per case")
+    args = parser.parse_args(argv)
+
+    report = {
+        "version": Meta.version,
+        "python": platform.python_version(),
+        "frame": bench_frame(args.frames),
+        "map": [bench_map(int(n), args.frames) for n in args.npcs.split(",")],
+        "message_log": [bench_messages(int(n), args.frames) for n in args.messages.split(",")],
+    }
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+    main()
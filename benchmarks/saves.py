@@ -0,0 +1,149 @@
+"""Benchmark save/load latency and file size for each save codec.
+
+Usage: python -m benchmarks.saves [--seeds N] [--repeat R] [--runs N] [--codecs legacy,none,zlib:1,zlib:6,lzma:6]
+
+Times Engine.save_as and setup_game.load_game for each codec, and Meta's
+settings and run log with --runs runs logged, against files in a temporary
+directory. Prints a JSON report to stdout. "legacy" is the lzma-over-pickle
+format saves used before game.savefile. Whether loads give back the game
+that was saved is covered by tests/test_saves.py.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import lzma
+import os
+import pickle
+import platform
+import sys
+import tempfile
+import time
+import warnings
+
+from game import savefile
+from game.setup_game import Meta, load_game
+
+from benchmarks.common import new_game, summarize
+
+
+class BenchSettings(Meta):
+    """Meta writing to the benchmark's scratch directory."""
+    settings_file = ""
+
+
+def legacy_save(obj, filename: str) -> None:
+    """The format saves used before the container: lzma over a default protocol pickle."""
+    with open(filename, "wb") as f:
+        f.write(lzma.compress(pickle.dumps(obj)))
+
+
+def fake_history(run: int):
+    return [("pickup item", f"item {i}", 240 + run + i) for i in range(20)] + [("lose", "scumming", 400 + run)]
+
+
+def bench_engine(engines, codec, repeat: int, scratch: str) -> dict:
+    filename = os.path.join(scratch, "savegame.sav")
+    saves, loads, sizes = [], [], []
+
+    for engine in engines:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            if codec == "legacy":
+                legacy_save(engine, filename)
+            else:
+                engine.save_as(filename)
+            saves.append(time.perf_counter() - start)
+            sizes.append(os.path.getsize(filename))
+
+            start = time.perf_counter()
+            load_game(filename)
+            loads.append(time.perf_counter() - start)
+
+    return {"save_sec": summarize(saves), "load_sec": summarize(loads), "bytes": summarize(sizes)}
+
+
+def bench_settings(runs: int, repeat: int, scratch: str) -> dict:
+    BenchSettings.settings_file = os.path.join(scratch, "settings.json")
+    BenchSettings.runs_file = os.path.join(scratch, "runs.jsonl")
+    BenchSettings.legacy_file = os.path.join(scratch, "savemeta.sav")
+
+    meta = BenchSettings()
+    for i in range(runs):
+        meta.log_run(fake_history(i))
+
+    loads, flushes, appends, reads = [], [], [], []
+    for i in range(repeat):
+        start = time.perf_counter()
+        meta = BenchSettings()
+        loads.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        meta.fullscreen = not meta.fullscreen
+        meta.flush()
+        flushes.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        meta.log_run(fake_history(runs + i))
+        appends.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        assert len(meta.old_runs) == runs + i + 1
+        reads.append(time.perf_counter() - start)
+
+    return {
+        "runs": runs,
+        "load_sec": summarize(loads),
+        "save_sec": summarize(flushes),
+        "log_run_sec": summarize(appends),
+        "old_runs_sec": summarize(reads),
+        "settings_bytes": os.path.getsize(BenchSettings.settings_file),
+        "runs_bytes": os.path.getsize(BenchSettings.runs_file),
+    }
+
+
+def parse_codec(spec: str):
+    if spec == "legacy":
+        return spec
+    name, _, level = spec.partition(":")
+    return (name, int(level) if level else 0)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seeds", type=int, default=3, help="number of generated games to save")
+    parser.add_argument("--repeat", type=int, default=5, help="saves and loads per game")
+    parser.add_argument("--runs", type=int, default=200, help="run histories in the settings file")
+    parser.add_argument("--codecs", default="legacy,none,zlib:1,zlib:6,lzma:6")
+    args = parser.parse_args(argv)
+
+    codecs = [parse_codec(c) for c in args.codecs.split(",")]
+    engines = [new_game(seed) for seed in range(args.seeds)]
+
+    default = savefile.DEFAULT_CODEC
+    results = []
+    with tempfile.TemporaryDirectory() as scratch:
+        for codec in codecs:
+            # Engine.save_as writes with the default codec
+            savefile.DEFAULT_CODEC = codec if codec != "legacy" else default
+            results.append({
+                "codec": codec if codec == "legacy" else f"{codec[0]}:{codec[1]}",
+                "engine": bench_engine(engines, codec, args.repeat, scratch),
+            })
+        savefile.DEFAULT_CODEC = default
+        settings = bench_settings(args.runs, args.repeat, scratch)
+
+    report = {
+        "version": Meta.version,
+        "python": platform.python_version(),
+        "default_codec": "%s:%s" % savefile.DEFAULT_CODEC,
+        "results": results,
+        "settings": settings,
+    }
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+    main()
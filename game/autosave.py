@@ -0,0 +1,64 @@
+"""Background autosaves: snapshot on the main thread, compress and write on a worker."""
+from __future__ import annotations
+
+import queue
+import threading
+import traceback
+from typing import TYPE_CHECKING
+
+# game.entity as a module: input_handlers imports this while it is still loading
+from game import entity, journal, savefile
+
+if TYPE_CHECKING:
+    from game.engine import Engine
+
+
+# turns between autosaves, on top of the ones at each shift change
+AUTOSAVE_INTERVAL = 50
+
+
+def due(engine: Engine) -> bool:
+    """Whether the turn just taken calls for an autosave."""
+    if engine.turn_count - engine.last_autosave_turn >= AUTOSAVE_INTERVAL:
+        return True
+    return engine.turn_count % 20 == 0 and engine.hour in entity.SHIFT_TIMES and engine.last_autosave_turn != engine.turn_count
+
+
+class Autosaver:
+    """Writes saves on a daemon thread, one at a time, in the order they were taken."""
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.thread = None
+
+    def submit(self, engine: Engine) -> None:
+        """Snapshot `engine` and queue it to be written to its save file."""
+        sections = engine.save_sections()
+
+        # entries from here on go in a fresh segment the queued save doesn't cover
+        journal.rotate(engine.save_file, engine.journal_seq)
+        engine.last_autosave_turn = engine.turn_count
+
+        if not self.thread:
+            self.thread = threading.Thread(target=self.run, name="autosave", daemon=True)
+            self.thread.start()
+        self.jobs.put((engine.save_file, engine.journal_seq, sections))
+
+    def run(self) -> None:
+        while True:
+            filename, seq, sections = self.jobs.get()
+            try:
+                savefile.write_atomic(filename, savefile.encode(sections))
+                journal.prune(filename, seq)
+            except Exception:
+                # the journal still covers everything, so just try again next time
+                traceback.print_exc()
+            finally:
+                self.jobs.task_done()
+
+    def flush(self) -> None:
+        """Block until every queued save is on disk."""
+        self.jobs.join()
+
+
+autosaver = Autosaver()
@@ -0,0 +1,65 @@
+"""The window of the map that gets drawn, and translating between map and screen."""
+from __future__ import annotations
+
+from typing import Tuple, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from tcod import Console
+
+# x, y, width, height of the map's part of the screen, left of the HUD
+VIEWPORT = (0, 0, 57, 50)
+
+
+class Camera:
+    """Shows a window of the map, kept around whatever it follows, on a rectangle of the console.
+
+    The window stops at the map's edges, and a map smaller than the
+    rectangle is drawn from its top left. Positions work on ints and on
+    numpy arrays alike.
+    """
+
+    def __init__(self, x: int, y: int, width: int, height: int):
+        self.x, self.y = x, y
+        self.width, self.height = width, height
+        # map position shown at x,y, and how much of the map is shown
+        self.map_x = self.map_y = 0
+        self.shown_width, self.shown_height = width, height
+
+    def follow(self, map_width: int, map_height: int, x: int, y: int) -> None:
+        """Center the window on map position x,y as far as the map's edges allow."""
+        self.shown_width = min(self.width, map_width)
+        self.shown_height = min(self.height, map_height)
+        self.map_x = min(max(x - self.width // 2, 0), map_width - self.shown_width)
+        self.map_y = min(max(y - self.height // 2, 0), map_height - self.shown_height)
+
+    def views(self) -> Tuple[Tuple[slice, slice], Tuple[slice, slice]]:
+        """Slices of the console and of map arrays that line up with each other."""
+        w, h = self.shown_width, self.shown_height
+        return (
+            (slice(self.x, self.x + w), slice(self.y, self.y + h)),
+            (slice(self.map_x, self.map_x + w), slice(self.map_y, self.map_y + h)),
+        )
+
+    def in_view(self, x, y):
+        """Whether map position x,y is in the window."""
+        return (
+            (self.map_x <= x) & (x < self.map_x + self.shown_width) &
+            (self.map_y <= y) & (y < self.map_y + self.shown_height)
+        )
+
+    def to_screen(self, x, y):
+        return x - self.map_x + self.x, y - self.map_y + self.y
+
+    def to_map(self, x, y):
+        return x - self.x + self.map_x, y - self.y + self.map_y
+
+    def paint(self, console: Console, xs, ys, **channels) -> None:
+        """Set the tiles_rgb `channels` (ch, fg, bg) at map positions xs,ys, skipping any out of view."""
+        xs, ys = np.asarray(xs, dtype=np.intp), np.asarray(ys, dtype=np.intp)
+        shown = self.in_view(xs, ys)
+        xs, ys = self.to_screen(xs[shown], ys[shown])
+        tiles = console.tiles_rgb
+        for name, value in channels.items():
+            tiles[name][xs, ys] = value
@@ -10,6 +10,7 @@ import tcod
 from game.exceptions import Impossible
 from game.actions import Action, BumpAction, MovementAction, WaitAction, TalkAction, TazeAction
 from game import color
+from game.persistence import Persistent
 from game.render_functions import DIRECTIONS
 from game.components.status_effect import BeingEaten, Tazed
 
@@ -17,10 +18,14 @@ if TYPE_CHECKING:
     from game.entity import Actor
     from game.action import Action
 
-class BaseAI(Action):
+class BaseAI(Action, Persistent):
 
     _intent = None
+    # the last route goto found, only read on the turn it was planned
+    path = None
     short_description = ''
+    # both are worked out afresh every turn
+    transient = ("_intent", "path")
 
     @property
     def intent(self) -> Optional[List[Action]]:
@@ -603,10 +608,9 @@ class PeeNPC(DefaultNPC):
             if self.pee_duration < 1:
                 self.entity.last_peed = self.engine.turn_count
 
-            for tile in self.entity.room.inner:
-                if any(entity.xy == tile and entity is not self.entity for entity in self.entity.gamemap.entities):
-                    self._intent.append(TalkAction(self.entity,self.entity.x,self.entity.y))
-                    break
+            inner = self.entity.room.inner
+            if any(entity.xy in inner and entity is not self.entity for entity in self.entity.gamemap.entities):
+                self._intent.append(TalkAction(self.entity,self.entity.x,self.entity.y))
             self._intent.append(WaitAction(self.entity))
             return
 
@@ -618,11 +622,7 @@ class PeeNPC(DefaultNPC):
         toilets = [room for room in self.entity.gamemap.rooms if room.closet]
         path = None
         for toilet in toilets:
-            def occupied():
-                for tile in toilet.inner:
-                    if any(entity.xy == tile and not entity.changeling_form and entity is not self.entity for entity in self.entity.gamemap.entities):
-                        return True
-            if occupied():
+            if any(entity.xy in toilet.inner and not entity.changeling_form and entity is not self.entity for entity in self.entity.gamemap.entities):
                 continue
             for tile in toilet.inner:
                 this_path = self.get_path_to(*tile)
@@ -744,10 +744,7 @@ class EvacuationNPC(DefaultNPC):
             if self.entity.is_keyholder:
                 self.goto_gate()
             elif self.entity.id % 2 == 0:
-                tile = random.choice(self.engine.game_map.shuttle.inner)
-                while tile in self.engine.game_map.shuttle.evac_area:
-                    tile = random.choice(self.engine.game_map.shuttle.inner)
-                self.goto(tile)
+                self.goto(random.choice(self.engine.game_map.shuttle.waiting_area))
             else:
                 self.goto(random.choice([r for r in self.engine.game_map.rooms if r.name == "Main Hall"][0].inner))
         else:
@@ -1,7 +1,6 @@
 from __future__ import annotations
 
-import lzma
-import pickle
+import functools
 import os
 import math
 
@@ -10,9 +9,11 @@ from typing import TYPE_CHECKING
 from tcod.console import Console
 from tcod.map import compute_fov
 
-from game import exceptions, render_functions
+from game import autosave, exceptions, journal, render_functions, savefile
+from game.camera import Camera, VIEWPORT
 from game.actions import WaitAction, BumpAction
 from game.message_log import MessageLog
+from game.persistence import Persistent
 import game.color as color
 from game.render_order import RenderOrder
 from game.exceptions import Impossible
@@ -25,13 +26,56 @@ if TYPE_CHECKING:
 import utils
 
 
-class Engine:
+def per_turn(mouse: bool = False):
+    """Make an Engine method a property worked out at most once a turn, or once
+    per turn and mouse location with `mouse`.
+
+    update_fov drops everything worked out so far too, since that's where a
+    turn's changes, or a restored or loaded game's, show up on the map.
+    """
+    def decorator(method):
+        name = method.__name__
+
+        @functools.wraps(method)
+        def get(self):
+            key = (self.turn_count, self.mouse_location) if mouse else self.turn_count
+            if self._turn_memo is None:
+                self._turn_memo = {}
+            memo = self._turn_memo.get(name)
+            if memo is None or memo[0] != key:
+                memo = self._turn_memo[name] = key, method(self)
+            return memo[1]
+
+        return property(get)
+    return decorator
+
+
+class Engine(Persistent):
     game_map: GameMap
     game_world: GameWorld
- 
+    # SnapshotRing of recent turns, when debugging
+    snapshots = None
+    # the install's settings, which the menu hands to a loaded game
+    meta = None
+    mouse_location = (0, 0)
+    # name -> (key, value) for per_turn properties
+    _turn_memo = None
+    # this engine's cached HUD panels, made on first render
+    _hud_panels = None
+    # where checkpoints and the action journal go; None keeps the game unsaved
+    save_file = None
+    # sequence number of the next journaled player action
+    journal_seq = 0
+    last_autosave_turn = 0
+    # not part of a run; a snapshot would otherwise also carry the ring it goes into
+    transient = ("meta", "snapshots", "mouse_location", "_turn_memo", "camera", "_hud_panels")
+
     def __init__(self, player: Actor, meta):
-        self.message_log = MessageLog(self)
+        self._message_log = MessageLog(self)
+        # compressed message log of a loaded save, until something reads it
+        self._message_log_section = None
         self.mouse_location = (0, 0)
+        self.camera = Camera(*VIEWPORT)
         self.player = player
         self.turn_count = 0
         self.show_instructions = False
@@ -48,6 +92,43 @@ class Engine:
 
         self.history = []
 
+        self.save_file = None
+        self.journal_seq = 0
+        self.last_autosave_turn = 0
+
+    def __getstate__(self):
+        if self._message_log_section is not None:
+            self.message_log
+        return super().__getstate__()
+
+    def __setstate__(self, state):
+        if "message_log" in state:
+            # saves from before the message log loaded lazily
+            state["_message_log"] = state.pop("message_log")
+            state["_message_log_section"] = None
+        super().__setstate__(state)
+
+    def rebuild(self) -> None:
+        self.camera = Camera(*VIEWPORT)
+
+    @property
+    def hud_panels(self) -> dict:
+        if self._hud_panels is None:
+            self._hud_panels = render_functions.hud_panels()
+        return self._hud_panels
+
+    @property
+    def message_log(self) -> MessageLog:
+        if self._message_log_section is not None:
+            self._message_log = self._message_log_section.load(persistent_load=lambda pid: self)
+            self._message_log_section = None
+        return self._message_log
+
+    def defer_message_log(self, section) -> None:
+        """Load the message log from a save section the first time it's used."""
+        self._message_log = None
+        self._message_log_section = section
+
     def log_run(self):
         self.meta.log_run(self.history)
 
@@ -101,12 +182,33 @@ class Engine:
 
     @property
     def can_see_enemies(self):
-        return len([a for a in self.fov_actors]) > 0
+        return len(self.fov_actors) > 0
 
     @property
     def stairs_visible(self):
         return self.game_map.visible[self.game_map.downstairs_location]
 
+    def perform_player_action(self, action) -> bool:
+        """Perform a player action and, if it was possible, the rest of the turn.
+
+        Returns True if the action advanced a turn.
+        """
+        try:
+            action.perform()
+        except exceptions.Impossible as exc:
+            self.message_log.add_message(exc.args[0], color.grey)
+            return False  # Skip enemy turn on exceptions.
+
+        else:
+            self.player.just_took_damage = False
+            if self.player.is_alive:
+                self.handle_enemy_turns()
+
+        self.update_fov()
+        if self.snapshots is not None:
+            self.snapshots.take(self)
+        return True
+
     def handle_enemy_turns(self) -> None:
         enemies = sorted(set(self.game_map.actors) - {self.player}, key=lambda x: x.id)
 
@@ -139,7 +241,7 @@ class Engine:
             radius=self.fov_radius,
         )
 
-    @property
+    @per_turn()
     def fov_actors(self):
         return [actor for actor in 
             sorted(list(self.game_map.actors),key=lambda a:a.id) if
@@ -149,7 +251,7 @@ class Engine:
             )
         ]
 
-    @property
+    @per_turn(mouse=True)
     def mouse_things(self):
         entities = [
             e for e in self.game_map.entities if 
@@ -163,7 +265,7 @@ class Engine:
 
         x,y = self.mouse_location
         if self.game_map.visible[x,y] or self.game_map.explored[x,y] or self.game_map.mapped[x,y]:
-            entities += [self.game_map.tiles[x,y]]
+            entities += [tile_types.TILES[self.game_map.tiles[x,y]]]
 
         return entities
 
@@ -174,9 +276,10 @@ class Engine:
             self.game_map.visible[:] = self.fov
         # If a tile is "visible" it should be added to "explored".
         self.game_map.explored |= self.game_map.visible
+        self._turn_memo = None
 
 
-    @property
+    @per_turn()
     def do_turn_count(self):
         for e in self.game_map.items:
             if e.x > 72 and e.y < 5 and self.game_map.explored[e.x,e.y]:
@@ -188,6 +291,11 @@ class Engine:
         return True
 
     def render(self, console: Console) -> None:
+        self.render_scene(console)
+        self.render_hover(console)
+
+    def render_scene(self, console: Console) -> None:
+        """Everything render draws but what depends on the mouse."""
         # all boxes 9 high
         # left box: 20 w (0,41)
         # mid: 40 w (21,41)
@@ -204,6 +312,8 @@ class Engine:
         # MIDDLE PANEL
         self.message_log.render(console=console, x=18, y=41, width=43, height=9)
 
+    def render_hover(self, console: Console) -> None:
+        """The left panel, and the field of view of whoever the mouse is over."""
         # LEFT PANEL
         looking = self.mouse_location != (0,0)
         if looking:
@@ -225,12 +335,48 @@ class Engine:
             pass
 
 
+    @property
+    def save_header(self) -> dict:
+        """The bits of a save the main menu can show without loading it."""
+        return {
+            "version": savefile.FORMAT_VERSION,
+            "turn_count": self.turn_count,
+            "hour": self.hour,
+            "player": self.player.name,
+            "alive": self.player.is_alive,
+            "journal_seq": self.journal_seq,
+        }
+
+    def save_sections(self) -> dict:
+        """Pickle this engine into save sections, without compressing them.
+
+        The header, history and message log each get a section of their own,
+        so they can be read without the rest. The world section is everything
+        else; the message log refers back to it for the engine.
+        """
+        message_log, history = self.message_log, self.history
+        self.history = self._message_log = None
+        try:
+            world = savefile.snapshot(self)
+        finally:
+            self.history, self._message_log = history, message_log
+
+        return {
+            "header": savefile.snapshot(self.save_header),
+            "history": savefile.snapshot(self.history),
+            "message_log": savefile.snapshot(self.message_log, persistent_id=lambda obj: "engine" if obj is self else None),
+            "world": world,
+        }
+
     def save_as(self, filename: str) -> None:
         """Save this Engine instance as a compressed file."""
-        meta = self.meta
-        self.meta = None
-        save_data = lzma.compress(pickle.dumps(self))
-        with open(filename, "wb") as f:
-            f.write(save_data)
-        self.meta = meta
-        
\ No newline at end of file
+        savefile.write_atomic(filename, savefile.encode(self.save_sections()))
+
+    def checkpoint(self, filename: str = None) -> None:
+        """Write a full save and start a fresh journal on top of it."""
+        filename = filename or self.save_file
+        # don't let a queued autosave land on top of this one
+        autosave.autosaver.flush()
+        self.save_as(filename)
+        journal.clear(filename)
+        self.last_autosave_turn = self.turn_count
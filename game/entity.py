@@ -27,6 +27,56 @@ if TYPE_CHECKING:
 
 T = TypeVar("T", bound="Entity")
 
+NPC_NAMES = [
+    "Alice","alex",
+    "Bob","brie",
+    "Charlie","cath",
+    "Doug","dee",
+    "Emily","elvis",
+    "Fred","flim",
+    "Grish","gav",
+    "Hal","horus",
+    "Ingus","ike",
+    "Josh","jupe",
+    "Kyle","kate",
+    "Lu","lee",
+    "Mo","mike",
+    "Ned","nance",
+    "Otto","oku",
+    "Pete","pat",
+    "Quincy","quark",
+    "Rod","rolo",
+    "Stu","suze",
+    "Tim","tam",
+    "Ulga","ulric",
+    "Viv","val",
+    "Yan","ymir",
+    "Zed","zack"
+]
+
+SHIFT_TIMES = (8,12,18,22)
+
+
+def shift_rooms(gamemap: GameMap) -> list:
+    """Rooms an NPC can be scheduled to work a shift in, besides the shuttle."""
+    return [r for r in gamemap.rooms if r.name not in ["Shuttle","Main Hall"] and not r.closet]
+
+
+def draw_schedule(rooms: list, shuttle, guards: dict) -> dict:
+    """Pick a room for each shift.
+
+    Each NPC guards the shuttle for one shift if that shift has fewer than
+    two guards yet. `guards` maps shift times to guard counts and is updated.
+    """
+    schedule = {}
+    for time in SHIFT_TIMES:
+        if shuttle in schedule.values() or guards[time] > 1:
+            schedule[time] = random.choice([r for r in rooms if r not in schedule.values()])
+        else:
+            schedule[time] = shuttle
+            guards[time] += 1
+    return schedule
+
 
 class Entity:
     """
@@ -34,6 +84,7 @@ class Entity:
     """
 
     parent: Union[GameMap, Inventory]
+    fov_radius = 8
 
     def __init__(
         self,
@@ -57,7 +108,6 @@ class Entity:
         self.render_order = render_order
         self._description=description
         self._flavor = flavor
-        self.fov_radius = 8
         if parent:
             # If parent isn't provided now then it will be set later.
             self.parent = parent
@@ -162,12 +212,16 @@ class Entity:
     @property
     def room(self):
         for room in self.gamemap.rooms:
-            if self.xy in room.tiles:
+            if room.contains(self.x, self.y):
                 return room
         return None
 
 
 class Actor(Entity):
+    # the same for every actor, so they stay out of saves
+    bumps = ('EAT','TALK')
+    max_vigor = 48
+
     def __init__(
         self,
         *,
@@ -203,9 +257,7 @@ class Actor(Entity):
         self.cause_of_death = ''
         self.schedule = {}
         self.changeling_form = False
-        self.bumps = ['EAT','TALK']
         self.bump_index = 1
-        self.max_vigor = 48
         self._vigor = 48
         self.just_took_damage = False
         self.known_changelings = []
@@ -319,32 +371,7 @@ class Actor(Entity):
 
     def preSpawn(self):
         while self.name == "<Unnamed>" or self.name in [e.name for e in self.gamemap.entities]:
-            self.name = random.choice([
-                "Alice","alex",
-                "Bob","brie",
-                "Charlie","cath",
-                "Doug","dee",
-                "Emily","elvis",
-                "Fred","flim",
-                "Grish","gav",
-                "Hal","horus",
-                "Ingus","ike",
-                "Josh","jupe",
-                "Kyle","kate",
-                "Lu","lee",
-                "Mo","mike",
-                "Ned","nance",
-                "Otto","oku",
-                "Pete","pat",
-                "Quincy","quark",
-                "Rod","rolo",
-                "Stu","suze",
-                "Tim","tam",
-                "Ulga","ulric",
-                "Viv","val",
-                "Yan","ymir",
-                "Zed","zack"
-            ])
+            self.name = random.choice(NPC_NAMES)
             self.char = self.name[0]
             self.name = self.name.capitalize()
         if not self.schedule:
@@ -352,14 +379,39 @@ class Actor(Entity):
         self.last_peed = random.choice(range(240))
 
     def generateSchedule(self):
-        times = {8,12,18,22}
-        schedule = {}
-        for time in times:
-            shuttle_guards = len([a for a in self.gamemap.actors if time in a.schedule and a.schedule[time] == self.gamemap.shuttle])
-            shift_rooms = [r for r in self.gamemap.rooms if r.name not in ["Shuttle","Main Hall"] and not r.closet and r not in schedule.values()]
-            location = random.choice(shift_rooms) if self.gamemap.shuttle in schedule.values() or shuttle_guards > 1 else self.gamemap.shuttle
-            schedule[time] = location
-        self.schedule = schedule
+        shuttle = self.gamemap.shuttle
+        guards = dict.fromkeys(SHIFT_TIMES, 0)
+        for a in self.gamemap.actors:
+            for time, room in (a.schedule or {}).items():
+                if room is shuttle:
+                    guards[time] += 1
+        self.schedule = draw_schedule(shift_rooms(self.gamemap), shuttle, guards)
+
+    def instantiate(self, gamemap: GameMap, x: int, y: int, name: str, schedule: dict) -> Actor:
+        """Build a new actor from this template's settings and add it to `gamemap`.
+
+        A cheaper alternative to spawn for bulk population: nothing is deep
+        copied, and the caller supplies the name and schedule that preSpawn
+        would otherwise work out by scanning the map.
+        """
+        actor = Actor(
+            x=x,
+            y=y,
+            char=name[0],
+            color=self._color,
+            name=name.capitalize(),
+            move_speed=self.move_speed,
+            ai_cls=type(self.ai),
+            render_order=self.render_order,
+            description=self._description,
+            flavor=self._flavor
+        )
+        actor.parent = gamemap
+        actor.id = gamemap.next_id
+        actor.schedule = schedule
+        actor.last_peed = random.choice(range(240))
+        gamemap.entities.add(actor)
+        return actor
 
     def eat(self,target):
         if not self.changeling_form:
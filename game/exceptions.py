@@ -21,6 +21,9 @@ class QuitToMenu(Exception):
 class PickBumpType(Exception):
 	"""Player needs to pick what happens when they bump"""
 
+class ReplayError(Exception):
+	"""A journaled action failed on replay though it hadn't when it was played"""
+
 class NewGame(Exception):
 	def __init__(self,meta):
 		super().__init__()
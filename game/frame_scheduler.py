@@ -0,0 +1,86 @@
+"""Deciding when the main loop draws a frame."""
+from __future__ import annotations
+
+import time
+from typing import Iterable, Iterator, Optional
+
+import tcod.event
+
+
+def coalesce(events: Iterable[tcod.event.Event]) -> Iterator[tcod.event.Event]:
+    """`events` with each run of consecutive mouse motions cut down to its last one."""
+    motion = None
+    for event in events:
+        if isinstance(event, tcod.event.MouseMotion):
+            motion = event
+            continue
+        if motion is not None:
+            yield motion
+            motion = None
+        yield event
+    if motion is not None:
+        yield motion
+
+
+class FrameScheduler:
+    """Tracks whether anything on screen changed since the last frame.
+
+    Any event but a mouse motion may change anything, so it dirties the
+    frame. Mouse motions only do when a handler calls invalidate, as
+    EventHandler does when the hovered tile changes, or when they switch
+    handlers.
+
+    Separately, anything drawn with animation calls animate, and while the
+    last frame did, a tick comes due `rate` times a second. The main loop
+    then has the handler redraw just what animates, with `ticks` counting
+    up so the animation can pick its next frame.
+    """
+    # animation ticks per second
+    rate = 10
+
+    def __init__(self):
+        self.dirty = True
+        self.ticks = 0
+        self.next_tick = None
+        self.animated = False
+
+    def invalidate(self) -> None:
+        self.dirty = True
+
+    def note(self, event: tcod.event.Event) -> None:
+        """Account for an event about to be handled."""
+        if not isinstance(event, tcod.event.MouseMotion):
+            self.dirty = True
+
+    def animate(self) -> None:
+        """Note that the frame being drawn has animation in it."""
+        self.animated = True
+
+    @property
+    def frame_due(self) -> bool:
+        return self.dirty
+
+    @property
+    def tick_due(self) -> bool:
+        return self.next_tick is not None and time.monotonic() >= self.next_tick
+
+    def tick(self) -> None:
+        self.ticks += 1
+
+    def timeout(self) -> Optional[float]:
+        """Seconds to wait for events before the next tick, or None to wait for as long as it takes."""
+        if self.next_tick is None:
+            return None
+        return max(0.0, self.next_tick - time.monotonic())
+
+    def drawn(self) -> None:
+        self.dirty = False
+        now = time.monotonic()
+        if not self.animated:
+            self.next_tick = None
+        elif self.next_tick is None or self.next_tick <= now:
+            self.next_tick = now + 1 / self.rate
+        self.animated = False
+
+
+scheduler = FrameScheduler()
@@ -1,13 +1,18 @@
 from __future__ import annotations
 
-from typing import Iterable, Iterator, Optional, TYPE_CHECKING
+from typing import Iterable, Iterator, List, Optional, Tuple, TYPE_CHECKING
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np  # type: ignore
 from tcod.console import Console
 from tcod.map import compute_fov
+import pickle
 import random
 
 from game import color, tile_types
+from game.persistence import Persistent
+from game.render_order import RenderOrder
 from game.entity import Actor, Item
 from game.actions import ActionWithDirection
 from game.render_functions import DIRECTIONS, D_ARROWS
@@ -18,14 +23,92 @@ if TYPE_CHECKING:
     from game.entity import Entity
 
 
-class GameMap:
+class EntitySet(set):
+    """The entities on a map, with a version that goes up whenever one is added or removed.
+
+    Also keeps them bucketed by render order, rebuilt only when the version
+    changes. An entity's render order is taken to be fixed while it's on the
+    map; the player's can change, but the player is drawn on its own.
+    """
+
+    def __init__(self, entities: Iterable[Entity] = ()):
+        super().__init__(entities)
+        self.version = 0
+        self._layers = None
+        self._layers_key = None
+
+    def __reduce__(self):
+        # the buckets are rebuilt on demand, so only the members are saved
+        return (type(self), (list(self),))
+
+    def changed(self) -> None:
+        self.version += 1
+
+    def add(self, entity: Entity) -> None:
+        super().add(entity)
+        self.changed()
+
+    def remove(self, entity: Entity) -> None:
+        super().remove(entity)
+        self.changed()
+
+    def discard(self, entity: Entity) -> None:
+        super().discard(entity)
+        self.changed()
+
+    def pop(self) -> Entity:
+        entity = super().pop()
+        self.changed()
+        return entity
+
+    def clear(self) -> None:
+        super().clear()
+        self.changed()
+
+    def update(self, *others) -> None:
+        super().update(*others)
+        self.changed()
+
+    def difference_update(self, *others) -> None:
+        super().difference_update(*others)
+        self.changed()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __isub__(self, other):
+        self.difference_update(other)
+        return self
+
+    def layers(self, skip: Entity = None) -> List[Tuple[List[Entity], np.ndarray]]:
+        """The entities but `skip` grouped by render order, bottom layer first, each with a mask of which are actors."""
+        if self._layers_key != (self.version, skip):
+            buckets = {order: [] for order in sorted(RenderOrder, key=lambda order: order.value)}
+            for entity in self:
+                if entity is not skip:
+                    buckets[entity.render_order].append(entity)
+            self._layers = [
+                (bucket, np.fromiter((isinstance(e, Actor) for e in bucket), dtype=bool, count=len(bucket)))
+                for bucket in buckets.values() if bucket
+            ]
+            self._layers_key = (self.version, skip)
+        return self._layers
+
+
+class GameMap(Persistent):
+    # recomputed from the player's position by Engine.update_fov
+    transient = ("visible", "_hover_fov")
+    # ((actor, position, turn), fov) for print_enemy_fov
+    _hover_fov = None
+
     def __init__(
         self, engine: Engine, width: int, height: int, floor_number: int, items: Iterable, entities: Iterable[Entity] = (), vowel = None, decoy = None, game_mode = 'default'
     ):
         self.engine = engine
         self.width, self.height = width, height
-        self.entities = set(entities)
-        self.tiles = np.full((width, height), fill_value=tile_types.wall, order="F")
+        self.entities = EntitySet(entities)
+        self.tiles = tile_types.TileGrid(width, height, fill_value=tile_types.wall)
 
         self.visible = np.full(
             (width, height), fill_value=False, order="F"
@@ -48,9 +131,20 @@ class GameMap:
             self.explored = np.full((width,height),fill_value=True,order="F")
             self.visible = np.full((width,height),fill_value=True,order="F")
 
+    def rebuild(self) -> None:
+        if isinstance(self.tiles, np.ndarray):
+            # saves from before tiles were stored as ids
+            self.tiles = tile_types.TileGrid.from_records(self.tiles)
+        if not isinstance(self.entities, EntitySet):
+            # saves from before entities were kept in an EntitySet
+            self.entities = EntitySet(self.entities)
+        self.visible = np.full(
+            (self.width, self.height), fill_value=self.game_mode == 'overview', order="F"
+        )
+
     def room_at_location(self,x,y):
         for room in self.rooms:
-            if any(tile == (x,y) for tile in room.tiles):
+            if room.contains(x, y):
                 return room.name
         return ''
 
@@ -77,8 +171,10 @@ class GameMap:
         return self._next_id
 
     def bloody_floor(self,x,y):
-        if self.tiles[x,y] == tile_types.floor:
-            self.tiles[x,y] = tile_types.bloody_floor
+        # Corpses have never actually stained the floor: this compared whole
+        # tile records, which the NaN placeholder kept from ever being equal.
+        # Staining would be a gameplay change, so it stays off with tile ids.
+        pass
 
 
     def smellable(self,entity: Entity, super_smell:bool=False):
@@ -93,12 +189,8 @@ class GameMap:
 
 
     def make_mapped(self):
-        for i,row in enumerate(self.mapped):
-            for j, tile in enumerate(row):
-                if self.tiles[i,j] not in (tile_types.wall):
-                    self.mapped[i,j] = True
-                if self.tiles[i,j] == tile_types.down_stairs:
-                    self.explored[i,j] = True
+        self.mapped |= self.tiles.ids != tile_types.wall
+        self.explored |= self.tiles.ids == tile_types.down_stairs
 
     
     def get_blocking_entity_at_location(
@@ -152,10 +244,8 @@ class GameMap:
             light_walls=False
         )
 
-        for x,row in enumerate(fom):
-            for y,cel in enumerate(row):
-                if cel and self.visible[x,y] and (x != entity.x or y != entity.y):
-                    console.tiles_rgb[x,y]['bg'] = color.highlighted_fom
+        fom[entity.x, entity.y] = False
+        self.engine.camera.paint(console, *np.nonzero(fom & self.visible), bg=color.highlighted_fom)
 
     def print_enemy_fov(self, console: Console, entity: Actor):
         if (
@@ -165,20 +255,23 @@ class GameMap:
         ):
             return
 
-        fov = compute_fov(
-            self.tiles["transparent"],
-            (entity.x, entity.y),
-            radius=8,
-            light_walls=False
-        )
-
-        for x,row in enumerate(fov):
-            for y,cel in enumerate(row):
-                if cel and self.visible[x,y] and (x != entity.x or y != entity.y):
-                    console.tiles_rgb[x,y]['bg'] = color.highlighted_fov
-                    console.tiles_rgb[x,y]['fg'] = (40,40,40)
-                    #console.print(x=x,y=y,string=" ",bg=color.highlighted_fov)
-
+        # the mouse tends to rest on someone, so keep their fov until they move or the turn passes
+        key = entity, entity.xy, self.engine.turn_count
+        if self._hover_fov is None or self._hover_fov[0] != key:
+            fov = compute_fov(
+                self.tiles["transparent"],
+                (entity.x, entity.y),
+                radius=8,
+                light_walls=False
+            )
+            fov[entity.x, entity.y] = False
+            self._hover_fov = key, fov
+
+        screen, window = self.engine.camera.views()
+        highlighted = (self._hover_fov[1] & self.visible)[window]
+        tiles = console.tiles_rgb[screen]
+        tiles["bg"][highlighted] = color.highlighted_fov
+        tiles["fg"][highlighted] = (40,40,40)
 
     def print_actor_tile(self,actor,location,console):
         fg = actor.color
@@ -229,6 +322,45 @@ class GameMap:
             return self.print_item_tile(entity,location,console)
 
 
+    def print_layer(self, entities: List[Entity], is_actor: np.ndarray, console: Console) -> None:
+        """Draw `entities` as print_actor_tile and print_item_tile would, in one write per channel.
+
+        `is_actor` marks the ones drawn as actors. Later entities cover
+        earlier ones on the same tile. Ones out of the camera's view are
+        left out.
+        """
+        camera = self.engine.camera
+        xs = np.fromiter((e.x for e in entities), dtype=np.intp, count=len(entities))
+        ys = np.fromiter((e.y for e in entities), dtype=np.intp, count=len(entities))
+
+        shown = camera.in_view(xs, ys)
+        visible = self.visible[xs, ys]
+        distance = np.maximum(abs(xs - self.engine.player.x), abs(ys - self.engine.player.y))
+        super_smelled = distance <= self.engine.foi_radius
+        smelled = distance <= self.engine.fos_radius
+
+        # actors out of sight show against grey when sensed, as a yellow ? when only smelled
+        shaded = is_actor & ~visible & (super_smelled | smelled) & shown
+        guessed = shaded & ~super_smelled
+        # items out of sight show dimmed where explored
+        dimmed = ~is_actor & ~visible & self.explored[xs, ys]
+
+        drawn = np.flatnonzero((visible | shaded | dimmed) & shown)
+        if not len(drawn):
+            return
+        ch = np.fromiter((ord(entities[i].char) for i in drawn), dtype=np.int32, count=len(drawn))
+        fg = np.array([entities[i].color for i in drawn], dtype=np.uint8).reshape(-1, 3)
+
+        ch[guessed[drawn]] = ord('?')
+        fg[guessed[drawn]] = color.yellow
+        fg[dimmed[drawn]] //= 2
+
+        xs, ys = camera.to_screen(xs, ys)
+        tiles = console.tiles_rgb
+        tiles["ch"][xs[drawn], ys[drawn]] = ch
+        tiles["fg"][xs[drawn], ys[drawn]] = fg
+        tiles["bg"][xs[shaded], ys[shaded]] = color.grey
+
     def render(self, console: Console) -> None:
         """
         Renders the map.
@@ -236,33 +368,37 @@ class GameMap:
         If a tile is in the "visible" array, then draw it with the "light" colors.
         If it isn't, but it's in the "explored" array, then draw it with the "dark" colors.
         Otherwise, the default is "SHROUD".
+
+        Only the window of the map around the player that the engine's
+        camera shows is drawn, wherever it puts it on the console.
         """
-        console.tiles_rgb[0 : self.width, 0 : self.height] = np.select(
-            condlist=[self.visible, self.explored, self.mapped],
-            choicelist=[self.tiles["light"], self.tiles["dark"], tile_types.MAPPED],
+        camera = self.engine.camera
+        camera.follow(self.width, self.height, *self.engine.player.xy)
+        screen, window = camera.views()
+
+        console.tiles_rgb[screen] = np.select(
+            condlist=[self.visible[window], self.explored[window], self.mapped[window]],
+            choicelist=[self.tiles["light"][window], self.tiles["dark"][window], tile_types.MAPPED],
             default=tile_types.SHROUD,
             #default=self.tiles["dark"]
         )
 
-        entities_sorted_for_rendering = sorted(
-            self.entities, key=lambda x: x.render_order.value
-        )         
-
-        # display entities
-        for entity in entities_sorted_for_rendering:
-            if isinstance(entity,Actor) and entity is not self.engine.player:
-                self.print_actor_tile(entity,entity.xy,console)
-            elif entity is self.engine.player:
-                continue
-            else:
-                self.print_item_tile(entity,entity.xy,console) # player counts as an item
+        # display entities, a layer at a time
+        for entities, is_actor in self.entities.layers(skip=self.engine.player):
+            self.print_layer(entities, is_actor, console)
 
-        self.print_item_tile(self.engine.player,self.engine.player.xy,console)
+        self.print_item_tile(self.engine.player,camera.to_screen(*self.engine.player.xy),console)
 
 
 class GameWorld:
     """
     Holds the settings for the GameMap, and generates new maps when moving down the stairs.
+
+    With `generation_workers` above 1, candidate layouts are generated in a
+    process pool. Candidate seeds are derived from one master seed drawn from
+    `random`, and the valid layout with the lowest seed index wins, so the
+    result doesn't depend on which worker finishes first. The pool only lasts
+    for the floor it generates.
     """
 
     def __init__(
@@ -272,7 +408,8 @@ class GameWorld:
         map_width: int,
         map_height: int,
         current_floor: int=0,
-        game_mode: str
+        game_mode: str,
+        generation_workers: int=0
     ):
         self.game_mode = game_mode
         self.engine = engine
@@ -280,6 +417,7 @@ class GameWorld:
         self.map_height = map_height
         self.current_floor = current_floor
         self.items = item_factories
+        self.generation_workers = generation_workers
 
     def generate_floor(self) -> None:
         from game.procgen import generate_dungeon
@@ -290,6 +428,10 @@ class GameWorld:
             self.engine.game_map = generate_consumable_testing_ground(engine=self.engine, items=self.items)
             return
 
+        if self.generation_workers > 1:
+            self.engine.game_map = self.generate_floor_parallel()
+            return
+
         self.engine.game_map = generate_dungeon(
             map_width=self.map_width,
             map_height=self.map_height,
@@ -297,4 +439,48 @@ class GameWorld:
             floor_number=self.current_floor,
             items=self.items,
             game_mode=self.game_mode
-        )
\ No newline at end of file
+        )
+
+    def generate_floor_parallel(self) -> GameMap:
+        from game.procgen import generate_candidate, place_player
+
+        master_seed = random.getrandbits(32)
+
+        # workers get their own copy of the engine to generate against
+        engine_data = pickle.dumps(self.engine)
+
+        pool = ProcessPoolExecutor(max_workers=self.generation_workers)
+        pending = deque()
+        next_index = 0
+
+        def submit():
+            nonlocal next_index
+            pending.append(pool.submit(
+                generate_candidate,
+                engine_data,
+                master_seed + next_index,
+                self.current_floor,
+                self.map_width,
+                self.map_height,
+                self.game_mode
+            ))
+            next_index += 1
+
+        try:
+            for i in range(self.generation_workers):
+                submit()
+
+            # accept in seed order: a later seed can't win while an earlier one is still running
+            while True:
+                result = pending.popleft().result()
+                if result:
+                    break
+                submit()
+        finally:
+            # candidates already running finish in the background and are dropped
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        dungeon, player_xy = result
+        dungeon.engine = self.engine
+        place_player(dungeon, player_xy, self.engine.player)
+        return dungeon
@@ -1,14 +1,16 @@
 from __future__ import annotations
 
+import bisect
 import os
 
 from typing import Callable, Optional, Tuple, TYPE_CHECKING, Union
 
+import numpy as np
 import tcod.event
 import math
 import glob
 
-from game import actions, color, exceptions
+from game import actions, autosave, color, exceptions, frame_scheduler, journal, render_functions, rich_text
 from game.actions import (
     Action,
     BumpAction,
@@ -16,7 +18,7 @@ from game.actions import (
     PickupAction,
 )
 from game.render_functions import DIRECTIONS, D_ARROWS
-from game.tile_types import NAMES, FLAVORS
+from game.tile_types import NAMES, FLAVORS, TILES
 
 import game.help_pages as help_pages
 
@@ -128,6 +130,9 @@ MainGameEventHandler will become the active handler.
 
 
 class BaseEventHandler(tcod.event.EventDispatch[ActionOrHandler]):
+    # (key, copy of the console) for render_backdrop
+    _backdrop = None
+
     def handle_events(self, event: tcod.event.Event) -> BaseEventHandler:
         """Handle an event and return the next active event handler."""
         state = self.dispatch(event)
@@ -139,6 +144,28 @@ class BaseEventHandler(tcod.event.EventDispatch[ActionOrHandler]):
     def on_render(self, console: tcod.Console) -> None:
         raise NotImplementedError()
 
+    def on_tick(self, console: tcod.Console) -> None:
+        """Redraw what animates on top of the last frame; by default, all of it."""
+        console.clear()
+        self.on_render(console)
+
+    def render_backdrop(self, console: tcod.Console, draw: Callable[[tcod.Console], None], key=(), dim: bool = False) -> None:
+        """Draw what's under this handler's overlay with `draw`, dimmed if `dim`.
+
+        Nothing moves under a modal handler, so the result is kept and copied
+        back in on later renders until `key` changes. Animation under it
+        stops with it.
+        """
+        backdrop = self._backdrop
+        if backdrop and backdrop[0] == key and backdrop[1].shape == console.rgba.shape:
+            console.rgba[...] = backdrop[1]
+            return
+        draw(console)
+        if dim:
+            console.tiles_rgb["fg"] //= 8
+            console.tiles_rgb["bg"] //= 8
+        self._backdrop = key, console.rgba.copy()
+
     def ev_quit(self, event: tcod.event.Quit) -> Optional[Action]:
         raise SystemExit()
 
@@ -180,31 +207,53 @@ class EventHandler(BaseEventHandler):
         if action is None:
             return False
 
-        try:
-            action.perform()
-        except exceptions.Impossible as exc:
-            self.engine.message_log.add_message(exc.args[0], color.grey)
-            return False  # Skip enemy turn on exceptions.
-
-        else:
-            self.engine.player.just_took_damage = False
-            if self.engine.player.is_alive:
-                self.engine.handle_enemy_turns()
+        engine = self.engine
+        if not engine.save_file:
+            return engine.perform_player_action(action)
 
-        self.engine.update_fov()
-        return True
+        journal.record(engine, action)
+        try:
+            performed = engine.perform_player_action(action)
+        except Exception:
+            journal.record_raised(engine)
+            raise
+        if performed and engine.player.is_alive and autosave.due(engine):
+            autosave.autosaver.submit(engine)
+        return performed
 
     def ev_mousemotion(self, event: tcod.event.MouseMotion) -> None:
-        if self.engine.game_map.in_bounds(event.tile.x, event.tile.y):
-            self.engine.mouse_location = event.tile.x, event.tile.y
-        else:
-            self.engine.mouse_location = (0,0)
+        camera = self.engine.camera
+        location = camera.to_map(*event.tile)
+        if not camera.in_view(*location):
+            location = (0,0)
+        if location != self.engine.mouse_location:
+            self.engine.mouse_location = location
+            frame_scheduler.scheduler.invalidate()
 
     def on_render(self, console: tcod.Console) -> None:
         self.engine.render(console)
 
+    def render_game(self, console: tcod.Console, dim: bool = False) -> None:
+        """Engine.render under a modal handler, kept by render_backdrop.
+
+        Messages still get logged when something under a modal fails, and
+        the hover panel follows the mouse, so undimmed it's drawn fresh on
+        top of the rest.
+        """
+        engine = self.engine
+        messages = len(engine.message_log.messages)
+        if dim:
+            self.render_backdrop(console, engine.render, (messages, engine.mouse_location), dim)
+        else:
+            self.render_backdrop(console, engine.render_scene, messages)
+            engine.render_hover(console)
+
 
 class MainGameEventHandler(EventHandler):
+    def on_tick(self, console: tcod.Console) -> None:
+        # nothing is drawn over the HUD here, so its glitches can be redrawn in place
+        render_functions.render_glitches(console, self.engine.turn_count, self.engine.player, redraw=True)
+
     def handle_events(self, event):
         te = self.engine.meta.tutorial_events
 
@@ -304,44 +353,11 @@ class AskUserEventHandler(EventHandler):
 
     def print_multicolor_box(self, console, x, y, width, height, parts):
         """For highlighting stat-affected numbers"""
-        wx = x
-        wy = y
-        for part in parts:
-            for word in str(part[0]).split():
-                if wx + len(word) > x+width:
-                    wx = x
-                    wy += 1
-                console.print(wx,wy,word,part[1])
-                wx += len(word)+1
+        parts = tuple((text, tuple(fg)) for text, fg in parts)
+        rich_text.word_wrapped(parts, width).print(console, x, y)
 
     def print_multicolor(self,console,x,y,body):
-        wx = x
-        wy = y
-        fg = color.grey
-
-        fgs = body[1]
-        fg_index = 0
-
-        for c in body[0]:
-            if c == "\n":
-                wy += 1
-                wx = x
-                continue
-            if c == "$":
-                if fg == color.grey:
-                    fg = color.offwhite
-                else:
-                    fg = color.grey
-                continue
-            if c == "^":
-                if fg == color.grey:
-                    fg = fgs[fg_index]
-                    fg_index += 1
-                else:
-                    fg = color.grey
-                continue
-            console.print(wx,wy,c,fg)
-            wx += 1
+        rich_text.multicolor(body[0], tuple(map(tuple, body[1]))).print(console, x, y)
 
 
 class Confirm(EventHandler):
@@ -356,7 +372,7 @@ class Confirm(EventHandler):
         self.cancel_callback = cancel_callback
 
     def on_render(self,console):
-        self.parent.on_render(console)
+        self.render_backdrop(console, self.parent.on_render)
 
         x, y = (7,7) if not self.engine else (1,37)
         h = 5 if not self.engine else 3
@@ -388,12 +404,10 @@ class TutorialConfirm(EventHandler):
         }[prompt]
 
     def on_render(self,console):
-        super().on_render(console)
+        self.render_game(console)
 
         width = 50
-        height = console.get_height_rect(
-            0,0,width-2,40,self.prompt
-        )
+        height = rich_text.height(self.prompt, width-2, 40)
 
         console.draw_frame(0,38-height,width,height+2,fg=color.offwhite,bg=color.black)
         console.print_box(1,39-height,width-2,height,self.prompt,fg=color.offwhite,bg=color.black)
@@ -407,7 +421,7 @@ class TutorialConfirm(EventHandler):
 
 class ConfirmCombatHandler(EventHandler):
     def on_render(self,console):
-        super().on_render(console)
+        self.render_game(console)
         console.draw_frame(0,37,16,3,fg=color.offwhite, bg=color.black)
         console.print_box(1,38,79,1, "ENEMIES NEARBY", fg=color.offwhite, bg=color.black)
         console.print_box(0,39,16,1, "(space)", fg=color.offwhite, bg=color.black,alignment=tcod.CENTER)
@@ -421,8 +435,11 @@ class ConfirmCombatHandler(EventHandler):
 class GameOverEventHandler(EventHandler):
     def __init__(self,engine,loss=True,cause=None):
         super().__init__(engine)
+        autosave.autosaver.flush()
         if os.path.exists(utils.get_resource("savegame.sav")):
             os.remove(utils.get_resource("savegame.sav"))  # Deletes the active save file.
+        journal.clear(utils.get_resource("savegame.sav"))
+        self.engine.save_file = None
 
         event = 'lose' if loss else 'win'
         self.engine.history.append((event,self.engine.player.cause_of_death,self.engine.turn_count))
@@ -514,11 +531,14 @@ class HistoryViewer(EventHandler):
         super().__init__(engine)
         self.log_length = len(engine.message_log.messages)
         self.cursor = self.log_length - 1
+        # text area of the last render, which paging moves by
+        self.text_width, self.text_height = 72, 42
 
     def on_render(self, console: tcod.Console) -> None:
-        super().on_render(console)  # Draw the main state as the background.
+        self.render_game(console)  # Draw the main state as the background.
 
         log_console = tcod.Console(console.width - 6, console.height - 6)
+        self.text_width, self.text_height = log_console.width - 2, log_console.height - 2
 
         # Draw a frame with a custom banner title.
         log_console.draw_frame(0, 0, log_console.width, log_console.height)
@@ -531,16 +551,27 @@ class HistoryViewer(EventHandler):
             log_console,
             1,
             1,
-            log_console.width - 2,
-            log_console.height - 2,
-            self.engine.message_log.messages[: self.cursor + 1],
-            False
+            self.text_width,
+            self.text_height,
+            self.engine.message_log.messages,
+            False,
+            stop=self.cursor + 1
         )
         log_console.blit(console, 3, 3)
 
+    def page(self, direction: int) -> None:
+        """Scroll a screenful of lines up (-1) or down (1), to the message on that line."""
+        ends = self.engine.message_log.messages.line_ends(self.text_width)
+        target = ends[self.cursor] + direction * self.text_height
+        self.cursor = max(0, min(bisect.bisect_left(ends, target), self.log_length - 1))
+
     def ev_keydown(self, event: tcod.event.KeyDown) -> Optional[MainGameEventHandler]:
+        if event.sym == tcod.event.K_PAGEUP:
+            self.page(-1)
+        elif event.sym == tcod.event.K_PAGEDOWN:
+            self.page(1)
         # Fancy conditional movement to make it feel right.
-        if event.sym in CURSOR_Y_KEYS:
+        elif event.sym in CURSOR_Y_KEYS:
             adjust = CURSOR_Y_KEYS[event.sym]
             if adjust < 0 and self.cursor == 0:
                 # Only move from the top to the bottom when you're on the edge.
@@ -594,35 +625,25 @@ class InventoryEventHandler(AskUserEventHandler):
         if self.highlighted_item:
             if self.highlighted_item.identified:
                 if self.show_digest:
-                    self.digest_height = console.get_height_rect(
-                        self.frame_x+10,self.frame_y+1,self.frame_width-11,47-inner,self.highlighted_item.edible.description
-                    )
+                    self.digest_height = rich_text.height(self.highlighted_item.edible.description, self.frame_width-11, 47-inner)
                     inner += self.digest_height + 1
 
                 if self.show_spit:
-                    self.spit_height = console.get_height_rect(
-                        self.frame_x+10,self.frame_y+1,self.frame_width-11,47-inner,self.highlighted_item.spitable.description
-                    )
+                    self.spit_height = rich_text.height(self.highlighted_item.spitable.description, self.frame_width-11, 47-inner)
                     inner += self.spit_height + 1
 
                 if self.show_passive and self.highlighted_item.stat:
-                    self.passive_height = console.get_height_rect(
-                        self.frame_x+10,self.frame_y+1,self.frame_width-11,47-inner,f"+1 to AAAA while in WORD MODE"
-                    )
+                    self.passive_height = rich_text.height(f"+1 to AAAA while in WORD MODE", self.frame_width-11, 47-inner)
                     inner += self.passive_height + 1
 
             if self.highlighted_item.flavor:
-                self.flavor_height = console.get_height_rect(
-                    self.frame_x+1,self.frame_y+1,self.frame_width-2,47-inner,self.highlighted_item.flavor
-                )
+                self.flavor_height = rich_text.height(self.highlighted_item.flavor, self.frame_width-2, 47-inner)
                 inner += self.flavor_height + 1
 
         return inner
 
     def highlight_item(self, console: tcod.Console):
-        x, y = self.highlighted_item.xy
-        console.tiles_rgb["bg"][x, y] = color.white
-        console.tiles_rgb["fg"][x, y] = color.black
+        self.engine.camera.paint(console, *self.highlighted_item.xy, bg=color.white, fg=color.black)
 
     def render_item_panel(self, console: tcod.Console):
         # print main popup
@@ -712,7 +733,7 @@ class InventoryEventHandler(AskUserEventHandler):
 
 
     def on_render(self, console: tcod.Console) -> None:
-        super().on_render(console)
+        self.render_game(console)
         self.render_menu(console)
 
 
@@ -769,7 +790,7 @@ class HelpMenuHandler(AskUserEventHandler):
         self.cursor = 0
 
     def on_render(self,console):
-        super().on_render(console)
+        self.render_game(console)
         c1 = color.offwhite
         c2 = color.black
         c3 = color.grey
@@ -825,10 +846,8 @@ class SelectIndexHandler(AskUserEventHandler):
 
     def on_render(self, console: tcod.Console) -> None:
         """Highlight the tile under the cursor."""
-        super().on_render(console)
-        x, y = self.engine.mouse_location
-        console.tiles_rgb["bg"][x, y] = color.white
-        console.tiles_rgb["fg"][x, y] = color.black
+        self.render_game(console)
+        self.engine.camera.paint(console, *self.engine.mouse_location, bg=color.white, fg=color.black)
 
     def ev_keydown(self, event: tcod.event.KeyDown) -> Optional[ActionOrHandler]:
         """Check for key movement or confirmation keys."""
@@ -846,9 +865,10 @@ class SelectIndexHandler(AskUserEventHandler):
             dx, dy = MOVE_KEYS[key]
             x += dx * modifier
             y += dy * modifier
-            # Clamp the cursor index to the map size.
-            x = max(0, min(x, self.engine.game_map.width - 1))
-            y = max(0, min(y, self.engine.game_map.height - 1))
+            # Clamp the cursor index to the part of the map in view.
+            camera = self.engine.camera
+            x = max(camera.map_x, min(x, camera.map_x + camera.shown_width - 1))
+            y = max(camera.map_y, min(y, camera.map_y + camera.shown_height - 1))
             self.engine.mouse_location = x, y
             return None
         elif key in CONFIRM_KEYS:
@@ -857,9 +877,11 @@ class SelectIndexHandler(AskUserEventHandler):
 
     def ev_mousebuttondown(self, event: tcod.event.MouseButtonDown) -> Optional[ActionOrHandler]:
         """Left click confirms a selection."""
-        if self.engine.game_map.in_bounds(*event.tile):
+        camera = self.engine.camera
+        x, y = camera.to_map(*event.tile)
+        if camera.in_view(x, y):
             if event.button == 1:
-                return self.on_index_selected(*event.tile)
+                return self.on_index_selected(x, y)
         return super().ev_mousebuttondown(event)
 
     def on_index_selected(self, x: int, y: int) -> Optional[ActionOrHandler]:
@@ -925,12 +947,29 @@ class SingleProjectileAttackHandler(SelectIndexHandler):
         self.walkable=walkable
         self.pathfinder = pathfinder if pathfinder else self.engine.player.ai.get_path_to
 
+    # (mouse location, turn) path_to_target and path_end were found for
+    _path_key = None
+
     @property
     def path_to_target(self):
-        x,y = self.engine.mouse_location
-        if self.walkable and not self.engine.game_map.visible[x,y]:
-            return None
-        return self.pathfinder(x,y,walkable=self.walkable)
+        key = self.engine.mouse_location, self.engine.turn_count
+        if key != self._path_key:
+            self._path_key = key
+            x,y = self.engine.mouse_location
+            if self.walkable and not self.engine.game_map.visible[x,y]:
+                self._path = None
+            else:
+                self._path = self.pathfinder(x,y,walkable=self.walkable)
+            self._path_end = next(
+                (i for i, (px,py) in enumerate(self._path or ()) if self.ends_projectile_path(px,py)), None
+            )
+        return self._path
+
+    @property
+    def path_end(self) -> Optional[int]:
+        """The index in path_to_target of the tile the projectile stops on, if any."""
+        self.path_to_target
+        return self._path_end
 
     def ends_projectile_path(self, px, py):
         return (
@@ -946,19 +985,15 @@ class SingleProjectileAttackHandler(SelectIndexHandler):
         if not self.path_to_target:
             return
 
-        for px,py in self.path_to_target:
-            console.tiles_rgb["bg"][px, py] = color.bile
-            console.tiles_rgb["fg"][px, py] = color.black
-            if self.ends_projectile_path(px,py):
-                break
+        end = self.path_end
+        xs, ys = np.array(self.path_to_target[:None if end is None else end+1]).T
+        self.engine.camera.paint(console, xs, ys, bg=color.bile, fg=color.black)
 
     def on_index_selected(self, x: int, y: int) -> Optional[Action]:
         # select based on the line
-        if not self.path_to_target:
+        if self.path_end is None:
             return None
-        for px,py in self.path_to_target:
-            if self.ends_projectile_path(px,py):
-                return self.callback((px,py))
+        return self.callback(self.path_to_target[self.path_end])
 
 
 class SingleDrillingProjectileAttackHandler(SingleProjectileAttackHandler):
@@ -990,15 +1025,16 @@ class AreaRangedAttackHandler(SelectIndexHandler):
         x, y = self.engine.mouse_location
         radius = self.radius
 
+        area = []
         i = x - radius
         while i <= x+radius:
             j=y-radius
             while j <= y+radius:
                 if math.sqrt((x-i)**2 + (y-j)**2) <= radius:
-                    console.tiles_rgb["bg"][i, j] = color.white
-                    console.tiles_rgb["fg"][i, j] = color.black
+                    area.append((i, j))
                 j+=1
             i+=1
+        self.engine.camera.paint(console, *zip(*area), bg=color.white, fg=color.black)
 
     def on_index_selected(self, x: int, y: int) -> Optional[Action]:
         return self.callback((x, y))
@@ -1013,9 +1049,7 @@ class PopupMessage(BaseEventHandler):
 
     def on_render(self, console: tcod.Console) -> None:
         """Render the parent and dim the result, then print the message on top."""
-        self.parent.on_render(console)
-        console.tiles_rgb["fg"] //= 8
-        console.tiles_rgb["bg"] //= 8
+        self.render_backdrop(console, self.parent.on_render, dim=True)
         y = console.height // 2 if self.vpos == 'center' else 0
 
         console.print(
@@ -1068,10 +1102,7 @@ class PlayMenuHandler(AskUserEventHandler):
             y += 2
 
     def on_render(self, console: tcod.Console) -> None:
-        super().on_render(console)
-
-        console.tiles_rgb["fg"] //= 8
-        console.tiles_rgb["bg"] //= 8
+        self.render_game(console, dim=True)
 
         self.print_options(console)
 
@@ -1133,7 +1164,7 @@ class InspectHandler(AskUserEventHandler):
                 self.is_tile = True
         elif key >= len(engine.fov_actors):
             dsx,dsy = engine.game_map.downstairs_location
-            self.thing = thing = engine.game_map.tiles[dsx,dsy]
+            self.thing = thing = TILES[engine.game_map.tiles[dsx,dsy]]
             self.is_tile = True
         else:
             self.thing = thing = engine.fov_actors[key]
@@ -1157,9 +1188,7 @@ class InspectHandler(AskUserEventHandler):
         if self.thing is self.engine.player:
             return 3
 
-        inner = console.get_height_rect(
-            self.frame_x+1,self.frame_y+1,self.frame_width-2,47,self.flavor
-        )+3 if self.flavor else 2
+        inner = rich_text.height(self.flavor, self.frame_width-2, 47)+3 if self.flavor else 2
 
         flavor = inner
 
@@ -1224,7 +1253,7 @@ class InspectHandler(AskUserEventHandler):
 
 
     def on_render(self, console: tcod.Console) -> None:
-        super().on_render(console)
+        self.render_game(console)
         self.render_menu(console)
 
 
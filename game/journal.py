@@ -0,0 +1,177 @@
+"""Write-ahead journal of player actions, replayed on top of the last full save."""
+from __future__ import annotations
+
+import glob
+import os
+import pickle
+import random
+import traceback
+from typing import TYPE_CHECKING, Iterator, List
+
+# modules rather than names: input_handlers imports this while game.entity is still loading
+from game import actions, entity, exceptions
+
+if TYPE_CHECKING:
+    from game.engine import Engine
+
+# second field of the entry noting that the action before it raised
+RAISED = "raised"
+
+
+def journal_path(save_file: str) -> str:
+    return os.path.splitext(save_file)[0] + ".journal"
+
+
+def segment_paths(save_file: str) -> List[str]:
+    """Closed journal segments, oldest first. Each is named for the seq its entries stop before."""
+    live = journal_path(save_file)
+    segments = glob.glob(glob.escape(live) + ".*")
+    return sorted(segments, key=lambda path: int(path[len(live)+1:]))
+
+
+def encode_value(value):
+    if isinstance(value, entity.Entity):
+        return ("entity", value.id)
+    if isinstance(value, list):
+        return [encode_value(v) for v in value]
+    return value
+
+
+def decode_value(engine: Engine, value):
+    if isinstance(value, tuple) and len(value) == 2 and value[0] == "entity":
+        return find_entity(engine, value[1])
+    if isinstance(value, list):
+        return [decode_value(engine, v) for v in value]
+    return value
+
+
+def encode_action(action: actions.Action) -> tuple:
+    """Describe an action by class name and entity ids, so it can be rebuilt against any copy of the game."""
+    fields = {name: encode_value(value) for name, value in vars(action).items() if name != "entity"}
+    return (type(action).__name__, action.entity.id, fields)
+
+
+def decode_action(engine: Engine, encoded: tuple) -> actions.Action:
+    name, entity_id, fields = encoded
+    cls = getattr(actions, name)
+    action = cls.__new__(cls)
+    action.entity = find_entity(engine, entity_id)
+    for field, value in fields.items():
+        setattr(action, field, decode_value(engine, value))
+    return action
+
+
+def find_entity(engine: Engine, entity_id: int) -> entity.Entity:
+    for e in engine.game_map.entities:
+        if e.id == entity_id:
+            return e
+        inventory = getattr(e, "inventory", None)
+        if inventory:
+            for item in inventory.items:
+                if item.id == entity_id:
+                    return item
+    raise LookupError(f"No entity with id {entity_id}")
+
+
+def record(engine: Engine, action: actions.Action) -> None:
+    """Append `action` to the journal before it is performed.
+
+    The global RNG is reseeded from a fresh seed that goes in the entry, so
+    replay can put it back without storing the whole generator state.
+    """
+    seed = random.getrandbits(64)
+    entry = (engine.journal_seq, encode_action(action), engine.player.bump_index, seed)
+    with open(journal_path(engine.save_file), "ab") as f:
+        pickle.dump(entry, f)
+    engine.journal_seq += 1
+    random.seed(seed)
+
+
+def record_raised(engine: Engine) -> None:
+    """Note that the action recorded last raised an exception in the live game, which survived it."""
+    with open(journal_path(engine.save_file), "ab") as f:
+        pickle.dump((engine.journal_seq - 1, RAISED), f)
+
+
+def entries(save_file: str) -> Iterator[tuple]:
+    """Yield journal entries in order across segments, stopping at a torn final write."""
+    for path in segment_paths(save_file) + [journal_path(save_file)]:
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            continue
+        with f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except (EOFError, pickle.UnpicklingError):
+                    break
+
+
+def actions_performed(save_file: str) -> Iterator[tuple]:
+    """Yield (seq, encoded action, bump index, seed, raised) for each journaled action.
+
+    `raised` is whether the live game got an exception performing it.
+    """
+    pending = None
+    for entry in entries(save_file):
+        if len(entry) == 2:
+            if pending and entry == (pending[0], RAISED):
+                pending = pending[:4] + (True,)
+            continue
+        if pending:
+            yield pending
+        pending = tuple(entry) + (False,)
+    if pending:
+        yield pending
+
+
+def replay(engine: Engine, save_file: str) -> None:
+    """Redo the journaled actions the save in `engine` doesn't include yet.
+
+    An action may only raise here if it raised in the live game too;
+    otherwise the replayed game has gone its own way, and ReplayError
+    stops the replay.
+    """
+    for seq, encoded, bump_index, seed, raised in actions_performed(save_file):
+        if seq < engine.journal_seq:
+            continue
+        if seq > engine.journal_seq or not engine.player.is_alive:
+            break
+        engine.player.bump_index = bump_index
+        random.seed(seed)
+        try:
+            engine.perform_player_action(decode_action(engine, encoded))
+        except Exception as exc:
+            if not raised:
+                raise exceptions.ReplayError(f"Journaled action {seq} failed on replay but not when it was played") from exc
+            # the live game logged and survived this one too
+            traceback.print_exc()
+        engine.journal_seq = seq + 1
+
+
+def has_entries(save_file: str) -> bool:
+    """Whether any actions were journaled since the save was written."""
+    if segment_paths(save_file):
+        return True
+    return os.path.exists(journal_path(save_file)) and os.path.getsize(journal_path(save_file)) > 0
+
+
+def rotate(save_file: str, seq: int) -> None:
+    """Close the live journal as a segment ending before `seq`; new entries start a fresh one."""
+    if os.path.exists(journal_path(save_file)):
+        os.replace(journal_path(save_file), f"{journal_path(save_file)}.{seq}")
+
+
+def prune(save_file: str, seq: int) -> None:
+    """Remove the segments a save taken at `seq` already covers."""
+    live = journal_path(save_file)
+    for path in segment_paths(save_file):
+        if int(path[len(live)+1:]) <= seq:
+            os.remove(path)
+
+
+def clear(save_file: str) -> None:
+    for path in segment_paths(save_file) + [journal_path(save_file)]:
+        if os.path.exists(path):
+            os.remove(path)
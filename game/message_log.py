@@ -1,36 +1,179 @@
-from typing import Iterable, List, Reversible, Tuple
+from array import array
+from collections import deque
+from collections.abc import Sequence
+import functools
+from typing import Iterable, Iterator, List, Reversible, Tuple
 import textwrap
 
 import tcod
 
 from game import color
+from game.persistence import Persistent
 
+# messages kept whole in a MessageHistory; older ones are packed into tuples
+RECENT_MESSAGES = 1000
+
+# one line of a laid out message: (x offset, text, whether it's the argument)
+Line = Tuple[Tuple[int, str, bool], ...]
+
+
+class Message(Persistent):
+    # set again by the log it's loaded with
+    transient = ("parent", "_layouts")
+    # width -> lines, filled in as the message gets drawn
+    _layouts = None
 
-class Message:
     def __init__(self, text: str, fg: Tuple[int, int, int], message_log, arg: str = None, arg_color: str = None):
-        if arg:
-            self.plain_text = arg.join(text.split('?'))
-        else:
-            self.plain_text = text
         self.text = text
         self.fg = fg
         self.count = 1
         self.parent = message_log
         self.turn_count = self.parent.engine.turn_count
+        # how many times the turn changed between the first message of the log and this one
+        self.turn_index = 0
         self.arg = arg
         self.arg_color = arg_color
 
+    @property
+    def plain_text(self) -> str:
+        if self.arg:
+            return self.arg.join(self.text.split('?'))
+        return self.text
+
     @property
     def full_text(self) -> str:
         """The full text of this message, including the count if necessary."""
         return self.plain_text
 
+    def layout(self, width: int) -> Tuple[Line, ...]:
+        """This message wrapped to `width`, with the argument split out of its line."""
+        if self._layouts is None:
+            self._layouts = {}
+        lines = self._layouts.get(width)
+        if lines is None:
+            lines = self._layouts[width] = self.lay_out(width)
+        return lines
+
+    def height(self, width: int) -> int:
+        """The number of lines layout(width) has, without wrapping a message that fits on one."""
+        if self._layouts is None or width not in self._layouts:
+            text = self.full_text
+            if len(text) <= width and text.strip() and "\n" not in text and "\t" not in text:
+                return 1
+        return len(self.layout(width))
+
+    def lay_out(self, width: int) -> Tuple[Line, ...]:
+        # characters after the argument, counted back from the end of the text
+        tail = len(self.text.split('?')[1]) if self.arg else 0
+        arg_placed = not self.arg
+
+        lines = []
+        i = 0
+        for line in reversed(list(MessageLog.wrap(self.full_text, width))):
+            if not arg_placed and i + len(line) > tail:
+                end = len(line) - (tail - i)
+                start = max(end - len(self.arg), 0)
+                spans = ((0, line[:start], False), (start, line[start:end], True), (end, line[end:], False))
+                lines.append(tuple(span for span in spans if span[1]))
+                arg_placed = True
+            else:
+                lines.append(((0, line, False),))
+            i += len(line) + 1
+        lines.reverse()
+        return tuple(lines)
+
+    def pack(self) -> tuple:
+        return (self.text, self.fg, self.turn_count, self.turn_index, self.arg, self.arg_color)
+
+    @classmethod
+    def unpack(cls, fields: tuple) -> "Message":
+        message = cls.__new__(cls)
+        message.text, message.fg, message.turn_count, message.turn_index, message.arg, message.arg_color = fields
+        message.count = 1
+        message.parent = None
+        return message
+
+
+class MessageHistory(Sequence, Persistent):
+    """Every message of a run, oldest first.
+
+    The newest `maxlen` are kept as Messages, along with their cached
+    layouts; older ones are packed into tuples and unpacked when read.
+    """
+    transient = ("_line_ends",)
+    # width -> running line totals, see line_ends
+    _line_ends = None
+
+    def __init__(self, messages: Iterable[Message] = (), maxlen: int = RECENT_MESSAGES):
+        self.recent = deque(maxlen=maxlen)
+        self.archive: List[tuple] = []
+        for message in messages:
+            self.append(message)
+
+    def append(self, message: Message) -> None:
+        last = self.recent[-1] if self.recent else None
+        message.turn_index = last.turn_index + (message.turn_count != last.turn_count) if last else 0
+        if len(self.recent) == self.recent.maxlen:
+            self.archive.append(self.recent.popleft().pack())
+        self.recent.append(message)
+
+    def __len__(self) -> int:
+        return len(self.archive) + len(self.recent)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("message index out of range")
+        if index < len(self.archive):
+            return Message.unpack(self.archive[index])
+        return self.recent[index - len(self.archive)]
+
+    def __iter__(self) -> Iterator[Message]:
+        for fields in self.archive:
+            yield Message.unpack(fields)
+        yield from self.recent
+
+    def __reversed__(self) -> Iterator[Message]:
+        yield from reversed(self.recent)
+        for fields in reversed(self.archive):
+            yield Message.unpack(fields)
+
+    def before(self, stop: int) -> Iterator[Message]:
+        """The messages before index `stop`, newest first."""
+        for i in range(stop - 1, -1, -1):
+            yield self[i]
+
+    def line_ends(self, width: int) -> array:
+        """For each message, the lines taken by it and everything before it at `width`.
+
+        Every message is followed by a blank line. Totals are kept per width
+        and only extended for messages added since the last call.
+        """
+        if self._line_ends is None:
+            self._line_ends = {}
+        ends = self._line_ends.setdefault(width, array("q"))
+        total = ends[-1] if ends else 0
+        for i in range(len(ends), len(self)):
+            total += self[i].height(width) + 1
+            ends.append(total)
+        return ends
+
 
-class MessageLog:
+class MessageLog(Persistent):
     def __init__(self, engine) -> None:
-        self.messages: List[Message] = []
+        self.messages = MessageHistory()
         self.engine = engine
 
+    def rebuild(self) -> None:
+        if isinstance(self.messages, list):
+            # saves from before the log was a MessageHistory
+            self.messages = MessageHistory(self.messages)
+        for message in self.messages.recent:
+            message.parent = self
+
     def add_message(
         self, text: str, fg: Tuple[int, int, int] = color.offwhite, arg: str = None, arg_color: str = None
     ) -> None:
@@ -39,13 +182,6 @@ class MessageLog:
         If `stack` is True then the message can stack with a previous message
         of the same text.
         """
-        if arg:
-            ftext = arg.join(text.split('?'))
-        else:
-            ftext = text
-
-        last_msg = self.messages[-1] if self.messages else None
-
         self.messages.append(Message(text, fg, self, arg, arg_color))
 
     def render(
@@ -65,13 +201,15 @@ class MessageLog:
                 line, width, expand_tabs=True,
             )
 
-    def fade_colors(self, color, color2, fade_count):
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def fade_colors(color, color2, fade_count):
         fade_count += 1
         fade_count = (fade_count**2)/2 if fade_count > 1 else fade_count
         color = tuple(int(round(i/fade_count)) for i in color)
         if color2:
             color2 = tuple(int(round(i/fade_count)) for i in color2)
-        
+
         return color,color2
 
     def render_messages(
@@ -82,47 +220,36 @@ class MessageLog:
         width: int,
         height: int,
         messages: Reversible[Message],
-        fading: bool = True
+        fading: bool = True,
+        stop: int = None
     ) -> None:
         """Render the messages provided.
         The `messages` are rendered starting at the last message and working
-        backwards.
+        backwards, each one fainter than the turn after it when `fading`.
+        With `stop`, `messages` is a MessageHistory and rendering starts
+        just before that index instead.
         """
         y_offset = height - 1
 
-        last_turns = [self.messages[-1].turn_count] if self.messages else [0]
-
-        for message in reversed(messages):
-            i = 0
-            arg_printed = False
+        newest_turn = self.messages[-1].turn_count if self.messages else 0
+        top = None
 
+        for message in (reversed(messages) if stop is None else messages.before(stop)):
             fades = 0
             if fading:
-                for turn in last_turns:
-                    if message.turn_count < turn:
-                        fades += 1
-                if fades == len(last_turns):
-                    last_turns.append(message.turn_count)
-            mfg, afg = self.fade_colors(message.fg, message.arg_color, fade_count=fades)
-
-            lines = list(self.wrap(message.full_text, width))
-
-            for line in reversed(lines):
-                if message.arg and i + len(line) > len(message.text.split('?')[1]) and arg_printed == False:
-                    # we've printed backwards up to a line w/ an argument
-                    pos = len(message.text.split('?')[1])-i
-                    pos2 = pos + len(message.arg)
-
-                    console.print(x=x, y=y+y_offset,string=line[:-pos2], fg=mfg)
-                    console.print(x=x+len(line)-pos2, y=y+y_offset, string=line[-pos2:-pos],fg=afg)
-                    arg_printed = True
-                    console.print(x=x+len(line)-pos, y=y+y_offset, string=line[-pos:], fg=mfg)
-                else:
-                    console.print(x=x, y=y + y_offset, string=line, fg=mfg)
-                y_offset -= 1                
+                if top is None:
+                    top = message
+                    # the log's newest turn counts even when `messages` stops before it
+                    behind = 1 if message.turn_count < newest_turn else 0
+                fades = top.turn_index - message.turn_index + behind
+            mfg, afg = self.fade_colors(message.fg, message.arg_color, fades)
+
+            for line in reversed(message.layout(width)):
+                for dx, string, is_arg in line:
+                    console.print(x=x+dx, y=y+y_offset, string=string, fg=afg if is_arg else mfg)
+                y_offset -= 1
                 if y_offset < 0:
                     return  # No more space to print messages.
-                i += len(line)+1
             y_offset -= 1
             if y_offset < 0:
                 return
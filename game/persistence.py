@@ -0,0 +1,33 @@
+"""Pickling only the state that can't be rebuilt."""
+from __future__ import annotations
+
+from typing import FrozenSet, Tuple
+
+
+class Persistent:
+    """Leaves the attributes named in `transient` out of pickles.
+
+    Each class names its own, and they add up over subclasses. Give every
+    transient attribute a class-level default, or rebuild it in `rebuild`,
+    which runs once the rest of the state is back.
+    """
+
+    transient: Tuple[str, ...] = ()
+    _transient: FrozenSet[str] = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._transient = frozenset(name for klass in cls.__mro__ for name in vars(klass).get("transient", ()))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in self._transient:
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        """Recompute derived state after unpickling."""
@@ -6,10 +6,12 @@ from typing import Iterator, List, Tuple, TYPE_CHECKING, Iterable
 import tcod
 import numpy
 import copy
+import functools
 import random
 import math
+import pickle
 
-from game.entity import Item
+from game.entity import Item, NPC_NAMES, SHIFT_TIMES, draw_schedule, shift_rooms
 
 from game import entity_factories, tile_types
 from game.game_map import GameMap
@@ -21,8 +23,106 @@ if TYPE_CHECKING:
 	from game.engine import Engine
 
 
+class Occupancy:
+	"""Grids of the tiles claimed by finalized rooms, for fast fit tests during generation."""
+
+	def __init__(self, width: int, height: int):
+		self.width = width
+		self.height = height
+		self.rooms = numpy.zeros((width,height),dtype=bool,order="F")
+		# tiles closets must keep clear of: closets and the main hall, plus a 1 tile margin
+		self.closet_zone = numpy.zeros((width,height),dtype=bool,order="F")
+
+	def claim(self, room):
+		xs, ys = numpy.array(room.tiles).T
+		self.rooms[xs,ys] = True
+		if room.closet or room.name == "Main Hall":
+			for dx in (-1,0,1):
+				for dy in (-1,0,1):
+					self.closet_zone[xs+dx,ys+dy] = True
+
+	def fits(self, x1: int, x2: int, y1: int, y2: int, closet: bool) -> bool:
+		if x1 < 1 or x2 > self.width-3 or y1 < 1 or y2 > self.height-3:
+			return False
+		if self.rooms[x1:x2+1,y1:y2+1].any():
+			return False
+		if closet and self.closet_zone[x1:x2+1,y1:y2+1].any():
+			return False
+		return True
+
+
+@functools.lru_cache(maxsize=None)
+def room_footprints(min_size: int, max_size: int, closet: bool, samples: int = 400) -> Tuple[Tuple[int,int,int,int], ...]:
+	"""Pre-grown room footprints for one size class.
+
+	Each footprint is an (x1,x2,y1,y2) rectangle relative to the door tile, for
+	a room growing away from a parent that lies below it. Footprints are grown
+	the same way rooms used to grow tile by tile, just without obstacles, and
+	duplicates are kept so picking one at random follows the same distribution.
+	"""
+	rng = random.Random(f"{min_size},{max_size},{closet}")
+	forbidden_dir = (0,1)
+	footprints = []
+
+	while len(footprints) < samples:
+		x1 = x2 = y1 = y2 = 0
+		attempts = 0
+		while (x2-x1 < max_size or y2-y1 < max_size) and attempts < 100:
+			attempts += 1
+			potential_dirs = [d for d in DIRECTIONS if d != forbidden_dir and abs(d[0]) != abs(d[1]) and (d[0] == 0 or x2-x1 < max_size) and (d[1] == 0 or y2-y1 < max_size)]
+			d = rng.choice(potential_dirs)
+			x1 = x1 if d[0] > -1 else x1-1
+			x2 = x2 if d[0] < 1 else x2+1
+			y1 = y1 if d[1] > -1 else y1-1
+			y2 = y2 if d[1] < 1 else y2+1
+
+			if closet and (x2-x1 >= min_size or y2-y1 >= min_size) and x2-x1 > 0 and y2-y1 > 0:
+				break
+
+			if not closet and x2-x1 > min_size and y2-y1 > min_size and rng.random() < 0.29:
+				break
+
+		footprints.append((x1,x2,y1,y2))
+
+	return tuple(footprints)
+
+def orient_footprint(footprint, forbidden_dir):
+	"""Rotate a footprint from room_footprints so it grows away from `forbidden_dir`."""
+	x1,x2,y1,y2 = footprint
+	if forbidden_dir == (0,1):
+		return (x1,x2,y1,y2)
+	if forbidden_dir == (0,-1):
+		return (x1,x2,-y2,-y1)
+	if forbidden_dir == (1,0):
+		return (y1,y2,x1,x2)
+	return (-y2,-y1,x1,x2)
+
+
+class TileSet:
+	"""A frozen run of tiles: ordered for iteration and random picks, hashed for O(1) membership."""
+
+	def __init__(self, tiles: Iterable[Tuple[int,int]]):
+		self.tiles = tuple(tiles)
+		self.lookup = frozenset(self.tiles)
+
+	def __contains__(self, tile):
+		return tile in self.lookup
+
+	def __iter__(self):
+		return iter(self.tiles)
+
+	def __len__(self):
+		return len(self.tiles)
+
+	def __getitem__(self, i):
+		return self.tiles[i]
+
+
 class Room:
 	closet = False
+	# cached geometry, filled in by freeze() once the room is final
+	bounds = None
+	_inner = None
 
 	def __init__(self, x: int, y: int, map_width: int, map_height: int, dungeon, name:str=''):
 		self.seed = (x,y)
@@ -37,6 +137,33 @@ class Room:
 		for tile in self.inner:
 			self.dungeon.tiles[tile] = tile_types.floor
 		self.dungeon.rooms.append(self)
+		self.dungeon.occupancy.claim(self)
+		self.freeze()
+
+	def freeze(self):
+		"""Cache this room's geometry; its tiles don't change after finalize."""
+		self._inner = TileSet(self.find_inner())
+		self.tiles = TileSet(self.tiles)
+		xs = [x for x,y in self.tiles]
+		ys = [y for x,y in self.tiles]
+		self.bounds = (min(xs),min(ys),max(xs),max(ys))
+
+	@property
+	def inner(self):
+		if self._inner is not None:
+			return self._inner
+		return self.find_inner()
+
+	def find_inner(self):
+		return self.tiles
+
+	def contains(self, x, y):
+		"""Whether x,y is one of this room's tiles. The bounding box rules most rooms out."""
+		if self.bounds is not None:
+			x1,y1,x2,y2 = self.bounds
+			if not (x1 <= x <= x2 and y1 <= y <= y2):
+				return False
+		return (x,y) in self.tiles
 
 class MainHall(Room):
 	def __init__(self,map_width,map_height,dungeon):
@@ -85,10 +212,6 @@ class MainHall(Room):
 	def center(self):
 		return self.seed
 
-	@property
-	def inner(self):
-		return self.tiles
-
 class AuxHall(MainHall):
 	def __init__(self,map_width,map_height,dungeon,hall):
 		self.parent = hall
@@ -112,6 +235,8 @@ class AuxHall(MainHall):
 class MainRoom(Room):
 	min_size = 3
 	max_size = 7
+	# prefab footprints to try at each seed before giving up on it
+	shape_tries = 20
 
 	def __init__(self,map_width,map_height,dungeon,parent):
 		self.parent = parent
@@ -138,8 +263,7 @@ class MainRoom(Room):
 				closet.name = initials + suffix
 				break
 
-	@property
-	def inner(self):
+	def find_inner(self):
 		return [tile for tile in self.tiles if tile[0] not in [self.x1,self.x2] and tile[1] not in [self.y1,self.y2] ]
 
 	def finalize(self):
@@ -157,7 +281,7 @@ class MainRoom(Room):
 				if abs(d[0]) == abs(d[1]):
 					continue
 				sprout = (seed[0]+d[0],seed[1]+d[1])
-				if any(sprout in room.tiles for room in self.dungeon.rooms):
+				if self.dungeon.occupancy.rooms[sprout]:
 					continue
 				sprouts.append(sprout)
 			if not sprouts:
@@ -168,92 +292,27 @@ class MainRoom(Room):
 
 	def generate(self):
 		forbidden_dir = (self.seed[0]-self.sprout[0],self.seed[1]-self.sprout[1])
+		sap = (self.sprout[0] - forbidden_dir[0], self.sprout[1] - forbidden_dir[1])
 
-		ce = -1
-
-		sap = (self.sprout[0] + (forbidden_dir[0]* ce), self.sprout[1] + (forbidden_dir[1]* ce))
-		
-		for room in self.dungeon.rooms:
-			if sap in room.tiles:
-				return
-
-		x1 = x2 = self.sprout[0]
-		y1 = y2 = self.sprout[1]
-		tiles = [sap]
-
-		min_size = self.min_size
-		max_size = self.max_size
-		attempts = 0
-
-		while (x2-x1 < max_size or y2-y1 < max_size) and attempts < 100:
-			attempts += 1
-
-			potential_dirs = [d for d in DIRECTIONS if d != forbidden_dir and abs(d[0]) != abs(d[1]) and (d[0] == 0 or x2-x1 < max_size) and (d[1] == 0 or y2-y1 < max_size)]
-			random.shuffle(potential_dirs)
-
-			grew = False
-
-			for d in potential_dirs:
-				nx1 = x1 if d[0] > -1 else x1-1
-				nx2 = x2 if d[0] < 1 else x2+1
-				ny1 = y1 if d[1] > -1 else y1-1
-				ny2 = y2 if d[1] < 1 else y2+1
-
-				if nx1 < 1 or nx2 > self.map_width-3 or ny1 < 1 or ny2 > self.map_height-3:
-					continue
-
-				new_tiles = []
-				for x in range(nx1,nx2+1):
-					for y in range(ny1,ny2+1):
-						new_tiles.append((x,y))
-
-				def check_tiles(ts):
-					for room in self.dungeon.rooms:
-						for t1 in ts:
-							if t1 in room.tiles:
-								return False
-					return True
-
-				if not check_tiles(new_tiles):
-					continue
-
-				def next_to(tile1,tile2):
-					if abs(tile1[0]-tile2[0]) < 2 and abs(tile1[1]-tile2[1]) < 2:
-						return True
-					return False
-
-				def check_adjacency():
-					rooms = [r for r in self.dungeon.rooms if r.closet or r.name == "Main Hall"]
-					for r in rooms:
-						for t1 in r.tiles:
-							for t2 in new_tiles:
-								if next_to(t1,t2):
-									return False
-					return True
-
-				if self.closet and not check_adjacency():
-					continue
-
-				tiles = new_tiles
-				x1,x2,y1,y2 = (nx1,nx2,ny1,ny2)
-				grew = True
-				break
-
-			if not grew:
-				break
+		occupancy = self.dungeon.occupancy
+		if not self.dungeon.in_bounds(*sap) or occupancy.rooms[sap]:
+			return
 
-			if self.closet and (x2-x1 >= min_size or y2-y1 >= min_size) and x2-x1 > 0 and y2-y1 > 0:
-				break
+		footprints = room_footprints(self.min_size,self.max_size,self.closet)
+		sx, sy = self.sprout
 
-			if not self.closet and x2-x1 > min_size and y2-y1 > min_size and random.random() < 0.29:
-				break
+		for i in range(self.shape_tries):
+			x1,x2,y1,y2 = orient_footprint(random.choice(footprints),forbidden_dir)
+			x1,x2,y1,y2 = (x1+sx,x2+sx,y1+sy,y2+sy)
+			if not occupancy.fits(x1,x2,y1,y2,self.closet):
+				continue
 
-		if x2-x1 > min_size and y2-y1 > min_size or (self.closet and (x2-x1 >= min_size or y2-y1 >= min_size) and x2-x1 > 0 and y2-y1 > 0):
 			self.valid = True
-			self.tiles = tiles
+			self.tiles = [(x,y) for x in range(x1,x2+1) for y in range(y1,y2+1)]
 			self.x1,self.x2,self.y1,self.y2 = (x1,x2,y1,y2)
 			if self.closet:
 				self.sprout = self.seed
+			return
 
 class ShuttleRoom(MainRoom):
 	min_size = 11
@@ -269,6 +328,21 @@ class ShuttleRoom(MainRoom):
 		self.dungeon.tiles[self.bioscanner] = tile_types.bioscanner
 		self.dungeon.shuttle = self
 
+	_waiting_area = None
+
+	def freeze(self):
+		super().freeze()
+		self.evac_area = TileSet(self.evac_area)
+		self.fence = TileSet(self.fence)
+		self.lobby = TileSet(self.lobby)
+
+	@property
+	def waiting_area(self):
+		"""Shuttle tiles outside the evac area."""
+		if self._waiting_area is None:
+			self._waiting_area = TileSet(tile for tile in self.inner if tile not in self.evac_area)
+		return self._waiting_area
+
 	def generate(self):
 		super().generate()
 		if not self.valid:
@@ -334,16 +408,53 @@ class Closet(MainRoom):
 	max_size = 1
 	closet = True
 
-	@property
-	def inner(self):
+	def find_inner(self):
 		return self.tiles
 
 
 
-def generate_dungeon(floor_number, map_width, map_height, engine, game_mode, items):
-
+def generate_dungeon(floor_number, map_width, map_height, engine, game_mode, items, stats=None):
+	"""Generate layouts until one passes validation.
+
+	If a `stats` dict is given it's filled in with the number of rejected
+	layouts and the stats of the accepted one (see generate_layout).
+	"""
+	retries = 0
+	while True:
+		dungeon = generate_layout(floor_number,map_width,map_height,engine,game_mode,items,stats)
+		if dungeon:
+			if stats is not None:
+				stats['retries'] = retries
+			return dungeon
+		retries += 1
+
+def generate_candidate(engine_data, seed, floor_number, map_width, map_height, game_mode):
+	"""Process pool entry point: try a single seeded layout.
+
+	Returns the dungeon (detached from the worker's engine and player) and the
+	player's starting tile, or None if the layout was rejected.
+	"""
+	engine = pickle.loads(engine_data)
+	random.seed(seed)
+	dungeon = generate_layout(floor_number,map_width,map_height,engine,game_mode,[])
+	if not dungeon:
+		return None
+
+	player_xy = engine.player.xy
+	dungeon.entities.remove(engine.player)
+	dungeon.engine = None
+	return dungeon, player_xy
+
+def generate_layout(floor_number, map_width, map_height, engine, game_mode, items, stats=None):
+	"""Generate one candidate map, or return None if it fails validation.
+
+	If a `stats` dict is given, the shuttle attempts, room, closet and NPC
+	counts of the layout are recorded in it.
+	"""
+	stats = {} if stats is None else stats
 	dungeon = GameMap(engine, map_width, map_height, floor_number, entities=[engine.player], items=[], game_mode=game_mode)
-	
+	dungeon.occupancy = Occupancy(map_width,map_height)
+
 	hall = MainHall(map_width,map_height,dungeon)
 	hall.finalize()
 
@@ -351,6 +462,7 @@ def generate_dungeon(floor_number, map_width, map_height, engine, game_mode, ite
 	for i in range(attempts):
 		h = hall
 		shuttle = ShuttleRoom(map_width,map_height,dungeon,h)
+		stats['shuttle_attempts'] = i+1
 		if not shuttle.valid:
 			continue
 		shuttle.name = "Shuttle"
@@ -358,7 +470,7 @@ def generate_dungeon(floor_number, map_width, map_height, engine, game_mode, ite
 		break
 
 	if not shuttle.valid:
-		return generate_dungeon(floor_number,map_width,map_height,engine,game_mode,items)
+		return None
 
 	room_names = ["Bunks","Cafeteria","Engine","Bridge","Observation Deck","Lab","Rec Room","Holohall","Workshop","Green Room","Salon","Terrarium","Gym","Pressurizer","Quantum Effigy","HR Office","Storage Room","Launchpad","Gunnery","Greenhouse","Kitchen","Chapel","Incident Room","Sprobble Nook"]
 	random.shuffle(room_names)
@@ -381,36 +493,33 @@ def generate_dungeon(floor_number, map_width, map_height, engine, game_mode, ite
 			break
 	
 	toilets = [room for room in dungeon.rooms if room.closet]
+	stats['room_count'] = len(dungeon.rooms)
+	stats['main_room_count'] = len(main_rooms)
+	stats['closet_count'] = len(toilets)
 	if len(toilets) < len(main_rooms)/4:
-		return generate_dungeon(floor_number,map_width,map_height,engine,game_mode,items)
+		return None
 
 	if len(main_rooms) < 9:
-		return generate_dungeon(floor_number,map_width,map_height,engine,game_mode,items)
+		return None
+
+	# only needed while rooms are being placed
+	del dungeon.occupancy
 
 	starting_toilet = random.choice(toilets)
 	place_player(dungeon,random.choice(starting_toilet.inner),engine.player)
 
-	toilet_tiles = starting_toilet.inner
-	random.shuffle(toilet_tiles)
-	for tile in toilet_tiles:
-		if tile != dungeon.engine.player.xy:
-			npc = entity_factories.NPC.spawn(dungeon,*tile)
-			npc.last_peed = 0
-			break
+	toilet_tiles = [tile for tile in starting_toilet.inner if tile != dungeon.engine.player.xy]
+	placements = [random.choice(toilet_tiles)]
 
 	NPC_number = math.floor(len(dungeon.rooms)*1.7)
-	for i in range(NPC_number):
-		room = random.choice([room for room in dungeon.rooms if room.name != "Shuttle" and not room.closet])
-		tiles = room.inner
-		random.shuffle(tiles)
-		for tile in tiles:
-			if any(entity.xy == tile for entity in dungeon.entities):
-				continue
-			entity_factories.NPC.spawn(dungeon,*tile)
-			break
+	placements += pick_npc_tiles(dungeon,NPC_number)
+
+	npcs = populate(dungeon,entity_factories.NPC,placements)
+	npcs[0].last_peed = 0
 
 	a_by_d = dungeon.actors
-	a_by_d.sort(key=lambda x: x.distance(*engine.player.xy))
+	stats['npc_count'] = len(a_by_d) - 1
+	a_by_d.sort(key=lambda x: (x.distance(*engine.player.xy),x.id))
 	kh1 = a_by_d[-1]
 	#kh2 = a_by_d[-2]
 	KeyHolder(kh1)
@@ -418,6 +527,48 @@ def generate_dungeon(floor_number, map_width, map_height, engine, game_mode, ite
 
 	return dungeon
 
+def pick_npc_tiles(dungeon, count):
+	"""Pick up to `count` free tiles in random non-shuttle, non-closet rooms.
+
+	Each room's free tiles are shuffled once and drawn from without
+	replacement; picks that land on a full room are skipped.
+	"""
+	rooms = [room for room in dungeon.rooms if room.name != "Shuttle" and not room.closet]
+	taken = {entity.xy for entity in dungeon.entities}
+	free_tiles = {}
+
+	tiles = []
+	for i in range(count):
+		room = random.choice(rooms)
+		if room not in free_tiles:
+			free_tiles[room] = [tile for tile in room.inner if tile not in taken]
+			random.shuffle(free_tiles[room])
+		if free_tiles[room]:
+			tiles.append(free_tiles[room].pop())
+	return tiles
+
+def populate(dungeon, template, tiles):
+	"""Spawn one actor from `template` on each tile in a single pass.
+
+	Names are drawn from a shuffled pool without replacement, and shuttle
+	guard shifts are tracked with counters rather than by rescanning actors.
+	Stops early if the name pool runs out.
+	"""
+	taken_names = {entity.name for entity in dungeon.entities}
+	names = [name for name in NPC_NAMES if name.capitalize() not in taken_names]
+	random.shuffle(names)
+
+	rooms = shift_rooms(dungeon)
+	guards = dict.fromkeys(SHIFT_TIMES, 0)
+
+	actors = []
+	for tile in tiles:
+		if not names:
+			break
+		schedule = draw_schedule(rooms,dungeon.shuttle,guards)
+		actors.append(template.instantiate(dungeon,*tile,names.pop(),schedule))
+	return actors
+
 def place_player(dungeon,xy,player):
 	player.place(*xy,dungeon)
 	player.changeling_form = True
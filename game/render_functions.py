@@ -1,14 +1,17 @@
 from __future__ import annotations
 
-from typing import Tuple, TYPE_CHECKING
+from typing import Callable, Dict, NamedTuple, Tuple, TYPE_CHECKING
 
+import functools
 import random
 import math
 
-from game import color
+import tcod
+
+from game import color, frame_scheduler
 from game.message_log import MessageLog
 from game.render_order import RenderOrder
-from game.tile_types import NAMES, FLAVORS
+from game.tile_types import NAMES, FLAVORS, TILES
 
 if TYPE_CHECKING:
     from tcod import Console
@@ -20,37 +23,116 @@ D_ARROWS = ['↑', '↓', '\\', '←', '/', '/','→','\\']
 D_KEYS = ['K','J','Y','H','B','U','L','N']
 ALPHA_CHARS = ['A','B','C','D','E','F','G','H','I','J','K','L','M','N','O','P','Q','R','S','T','U','V','W','X','Y','Z']
 
-def render_run_info(
-    console: Console, turn_count: int, player
-) -> None:
+# glitch frames drawn per turn in changeling form, cycled through by animation ticks
+GLITCH_FRAMES = 8
+
+GLITCH_SYMBOLS = ['~','`','☺','☻','♂','♀','►','↕','¶','§','æ','¿','¼','⌐','¬','Θ','φ','²']
+GLITCH_BLOCKS = ['▬','«','░','▒','▓','╖','╣','╛','╬','█','▄','▌','▐','▀','■']
 
-    random.seed(turn_count*player.x*player.y)
-
-    def morph(s,f=0.1):
-
-        if s == '\n':
-            return s
-        if random.random()<f:
-            return s.upper()
-        if random.random()<f:
-            return s.lower()
-        if random.random()<f/2:
-            return '@'
-        if random.random()<f:
-            return random.choice(['~','`','☺','☻','♂','♀','►','↕','¶','§','æ','¿','¼','⌐','¬','Θ','φ','²'])
-        if random.random()<f/2:
-            return random.choice(['▬','«','░','▒','▓','╖','╣','╛','╬','█','▄','▌','▐','▀','■'])
+
+class Glitch(NamedTuple):
+    """One frame of the changeling HUD's garbled text and flickering colors."""
+    bump_rows: Tuple[str, ...]
+    tab: Tuple[str, ...]
+    name: str
+    schedule_color: Tuple[int, int, int]
+    schedule_rows: Tuple[Tuple[int, str], ...]
+    surroundings_color: Tuple[int, int, int]
+
+
+def morph(s, rng: random.Random, f=0.1):
+    if s == '\n':
         return s
+    if rng.random()<f:
+        return s.upper()
+    if rng.random()<f:
+        return s.lower()
+    if rng.random()<f/2:
+        return '@'
+    if rng.random()<f:
+        return rng.choice(GLITCH_SYMBOLS)
+    if rng.random()<f/2:
+        return rng.choice(GLITCH_BLOCKS)
+    return s
+
+
+@functools.lru_cache(maxsize=4)
+def glitch_frames(seed: int) -> Tuple[Glitch, ...]:
+    """The glitch frames for a turn, drawn from their own generator so rendering never touches the game's."""
+    rng = random.Random(seed)
+
+    def garble(text):
+        return ''.join([morph(a, rng) for a in text])
+
+    frames = []
+    for _ in range(GLITCH_FRAMES):
+        bump_rows = tuple(garble("EAT ←") for i in range(6))
+        tab = tuple(morph(a, rng) for a in "EAT")
+        name = garble("changeling\n░░░░░░░░░░")
+        schedule_color = color.dark_red if rng.random()<0.05 else color.changeling
+        schedule_rows = []
+        for i in range(4):
+            n = 'eateateateateateat'
+            if rng.random()<0.05:
+                n += 'e'
+            x = 59 if rng.random()<0.05 else 61
+            schedule_rows.append((x, garble(n)))
+        surroundings_color = color.dark_red if rng.random() < 0.05 else color.changeling
+        frames.append(Glitch(bump_rows, tab, name, schedule_color, tuple(schedule_rows), surroundings_color))
+    return tuple(frames)
 
 
+def render_glitches(console: Console, turn_count: int, player, redraw: bool = False) -> None:
+    """Draw the changeling form's garbled HUD panels, at the current animation frame.
 
+    With `redraw`, they go over the last full frame: frames whose insides
+    belong to someone else keep them, and the vigor frame's edge, which the
+    schedule can spill onto, is put back.
     """
-    Render the level the player is currently on, at the given location.
-    """
-    c = color.grey
+    frame_scheduler.scheduler.animate()
+    glitch = glitch_frames(turn_count*player.x*player.y)[frame_scheduler.scheduler.ticks % GLITCH_FRAMES]
+
+    console.draw_frame(70,3,9,5,fg=color.dark_red)
+    for i in range(6):
+        console.print(72,4+i,glitch.bump_rows[i],fg=color.dark_red)
+    for i in range(3):
+        console.print(70,4+i,glitch.tab[i],fg=color.black,bg=color.dark_red)
+
+    console.draw_frame(60,3,12,4,fg=color.changeling)
+    console.print(61,4,glitch.name,fg=color.changeling)
+
+    c = glitch.schedule_color
+    console.draw_frame(60,8,20,6,fg=c)
+    console.print_box(61,8,8,1,"SCHEDULE",fg=c)
+    for i, (x, n) in enumerate(glitch.schedule_rows):
+        console.print(x,9+i,n,color.dark_red)
+
+    console.draw_frame(60,15,20,10,fg=glitch.surroundings_color,clear=not redraw)
+    console.print_box(61,15,12,1,"SURROUNDINGS")
+
+    if redraw:
+        console.draw_frame(57,0,3,50,fg=color.changeling,clear=False)
 
-    # render day x + clock time
 
+class Panel:
+    """An off-screen console holding one HUD panel, redrawn only when the inputs it's keyed on change."""
+
+    def __init__(self, x: int, y: int, width: int, height: int, draw: Callable):
+        self.x, self.y = x, y
+        self.console = tcod.Console(width, height, order="F")
+        self.draw = draw
+        self.key = None
+
+    def render(self, console: Console, key: tuple) -> None:
+        """Blit this panel onto `console`, drawing it again first if `key` changed; draw gets the key's items."""
+        if key != self.key:
+            self.console.clear()
+            self.draw(self.console, *key)
+            self.key = key
+        self.console.blit(console, self.x, self.y)
+
+
+def draw_clock(console: Console, turn_count: int) -> None:
     day = math.floor(turn_count / 480)+1
     day = f"{day}" if day > 9 else f"0{day}"
 
@@ -60,110 +142,120 @@ def render_run_info(
     minute = (turn_count*3) % 60
     minute = f"{minute}" if minute > 9 else f"0{minute}"
 
-    console.print(71,1,f"{hour}:{minute}")
-    console.print(61,1,f"Day {day}")
+    console.print(10,0,f"{hour}:{minute}")
+    console.print(0,0,f"Day {day}")
 
-    
-    if not player.changeling_form:
-        console.draw_frame(70,3,9,5,fg=color.offwhite)
-        for i,b in enumerate(player.bumps):
-            c = color.offwhite if i == player.bump_index else color.grey
-            a = ' ←' if i == player.bump_index else ''
-            s = ' ' if b == 'EAT' else ''
-            console.print(72,4+i,f"{b}{s}{a}",fg=c)
-
-        for i in range(3):
-            console.print(70,4+i,"TAB"[i],fg=color.black,bg=color.offwhite)
-    else:
-        console.draw_frame(70,3,9,5,fg=color.dark_red)
-        for i in range(6):
-            console.print(72,4+i,''.join([morph(a) for a in "EAT ←"]),fg=color.dark_red)
-        for i in range(3):
-            console.print(70,4+i,morph("EAT"[i]),fg=color.black,bg=color.dark_red)
 
-    if not player.changeling_form:
-        console.draw_frame(60,3,9,4)
-        console.print_box(61,3,2,1,"ID")
-        console.print_box(61,4,7,1,player.name,fg=player.color)
-        if player.is_keyholder:
-            console.print_box(61,5,7,1,"KEYHOLD",fg=color.grey)
-    else:
-        console.draw_frame(60,3,12,4,fg=color.changeling)
-        name = "changeling\n░░░░░░░░░░"
-        name = ''.join([morph(a) for a in name])
-        console.print(61,4,name,fg=color.changeling)
+def draw_bumps(console: Console, bumps: Tuple[str, ...], bump_index: int) -> None:
+    console.draw_frame(0,0,9,5,fg=color.offwhite)
+    for i,b in enumerate(bumps):
+        c = color.offwhite if i == bump_index else color.grey
+        a = ' ←' if i == bump_index else ''
+        s = ' ' if b == 'EAT' else ''
+        console.print(2,1+i,f"{b}{s}{a}",fg=c)
 
-    if not player.changeling_form:
-        console.draw_frame(60,8,20,6)
-        console.print_box(61,8,8,1,"SCHEDULE")
+    for i in range(3):
+        console.print(0,1+i,"TAB"[i],fg=color.black,bg=color.offwhite)
 
-        
-        if player.name in player.engine.investigators:
-            i = player.engine.investigators.index(player.name)
-            missing = player.engine.investigations[i]
-            console.print_box(61,9,18,4,f"investigate {missing}'s disappearance\n(free roam)",fg=color.grey,bg=color.black)
-        else:
-            times = list(player.schedule.keys())
-            times.sort()
-            sched = ''
-            for j,i in enumerate(times):
-                k = f"0{i}" if i < 10 else i
-                n = player.schedule[i].name
-                if len(n) > 10:
-                    n = n[:8]+'..'
-                sched = f"{k}:00 - {n}"
-                c = color.offwhite if player.schedule[i] is player.scheduled_room else color.grey
-                console.print(61,9+j,sched,c)
 
-    else:
-        c = color.changeling
-        if random.random()<0.05:
-            c = color.dark_red
-        console.draw_frame(60,8,20,6,fg=c)
-        n = "SCHEDULE"
-        console.print_box(61,8,8,1,n,fg=c)
-        for i in range(4):
-            n = 'eateateateateateat'
-            if random.random()<0.05:
-                n += 'e'
-            x = 59 if random.random()<0.05 else 61
-            n = ''.join([morph(a) for a in n])
-            console.print(x,9+i,n,color.dark_red)
+def draw_id(console: Console, name: str, fg: Tuple[int, int, int], keyholder: bool) -> None:
+    console.draw_frame(0,0,9,4)
+    console.print_box(1,0,2,1,"ID")
+    console.print_box(1,1,7,1,name,fg=fg)
+    if keyholder:
+        console.print_box(1,2,7,1,"KEYHOLD",fg=color.grey)
 
-    if not player.changeling_form:
-        console.draw_frame(60,15,20,10)
-        console.print_box(61,15,12,1,"SURROUNDINGS")
-    else:
-        c = color.dark_red if random.random() < 0.05 else color.changeling
-        console.draw_frame(60,15,20,10,fg=c)
-        n = "SURROUNDINGS"
-        console.print_box(61,15,12,1,n)
 
-    if not player.changeling_form:
-        c = color.dark_red if player.just_took_damage else color.offwhite
-        console.draw_frame(60,26,20,24,fg=c)
-        console.print_box(61,26,3,1, "LOG")
-    else:
-        c = color.dark_red if player.just_took_damage else color.changeling
-        console.draw_frame(60,26,20,24,fg=c)
-        console.print_box(61,26,3,1,"LOG")
+def draw_schedule(console: Console, missing: str, schedule: tuple, time_block: int) -> None:
+    console.draw_frame(0,0,20,6)
+    console.print_box(1,0,8,1,"SCHEDULE")
+    if missing is not None:
+        console.print_box(1,1,18,4,f"investigate {missing}'s disappearance\n(free roam)",fg=color.grey,bg=color.black)
+        return
+
+    scheduled_room = dict(schedule).get(time_block)
+    for j,(i,room) in enumerate(schedule):
+        k = f"0{i}" if i < 10 else i
+        n = room.name
+        if len(n) > 10:
+            n = n[:8]+'..'
+        c = color.offwhite if room is scheduled_room else color.grey
+        console.print(1,1+j,f"{k}:00 - {n}",c)
+
+
+def draw_surroundings(console: Console) -> None:
+    console.draw_frame(0,0,20,10)
+    console.print_box(1,0,12,1,"SURROUNDINGS")
 
-    c = color.changeling if player.changeling_form else color.offwhite
-    console.draw_frame(57,0,3,50,fg=c)
 
-    y = 49-player.vigor
-    v = player.vigor
+def draw_log_frame(console: Console, fg: Tuple[int, int, int]) -> None:
+    console.draw_frame(0,0,20,24,fg=fg)
+    console.print_box(1,0,3,1,"LOG")
+
+
+def draw_vigor(console: Console, v: int, changeling_form: bool) -> None:
+    c = color.changeling if changeling_form else color.offwhite
+    console.draw_frame(0,0,3,50,fg=c)
 
     c = color.dark_red if v < 25 else color.changeling
-    if not player.changeling_form and v == 48:
+    if not changeling_form and v == 48:
         c = color.offwhite
 
-    console.print_box(58,y,1,v,"█\n"*v,fg=c)
+    console.print_box(1,49-v,1,v,"█\n"*v,fg=c)
 
     for k,i in enumerate("VIGOR"):
         c1 = c if v < 5-k else color.black
         c2 = color.black if v < 5-k else c
-        console.print(58,44+k,i,fg=c1,bg=c2)
+        console.print(1,44+k,i,fg=c1,bg=c2)
+
+
+def hud_panels() -> Dict[str, Panel]:
+    """A set of the right-hand HUD panels, in drawing order, for one engine to keep.
+
+    The glitched panels of the changeling form go over them uncached.
+    """
+    return {
+        "clock": Panel(61,1,15,1,draw_clock),
+        "bumps": Panel(70,3,9,5,draw_bumps),
+        "id": Panel(60,3,9,4,draw_id),
+        "schedule": Panel(60,8,20,6,draw_schedule),
+        "surroundings": Panel(60,15,20,10,draw_surroundings),
+        "log": Panel(60,26,20,24,draw_log_frame),
+        "vigor": Panel(57,0,3,50,draw_vigor),
+    }
+
+
+def render_run_info(
+    console: Console, turn_count: int, player
+) -> None:
+    """
+    Render the level the player is currently on, at the given location.
+    """
+    panels = player.engine.hud_panels
+    panels["clock"].render(console, (turn_count,))
+
+    if player.changeling_form:
+        render_glitches(console, turn_count, player)
+    else:
+        panels["bumps"].render(console, (tuple(player.bumps), player.bump_index))
+        panels["id"].render(console, (player.name, player.color, player.is_keyholder))
+
+        if player.name in player.engine.investigators:
+            i = player.engine.investigators.index(player.name)
+            panels["schedule"].render(console, (player.engine.investigations[i], (), None))
+        else:
+            # shift times and rooms, compared by identity, and which shift it is
+            panels["schedule"].render(console, (None, tuple(sorted(player.schedule.items())), player.time_block))
+
+        panels["surroundings"].render(console, ())
+
+    if not player.changeling_form:
+        c = color.dark_red if player.just_took_damage else color.offwhite
+    else:
+        c = color.dark_red if player.just_took_damage else color.changeling
+    panels["log"].render(console, (c,))
+
+    panels["vigor"].render(console, (player.vigor, player.changeling_form))
 
 def render_instructions(console: Console, location: Tuple[int,int]) -> None:
     pass
@@ -250,7 +342,7 @@ def print_fov_actors(console,player,xy):
     xs,ys = player.gamemap.downstairs_location
     if player.gamemap.visible[xs,ys]:
         tile = player.gamemap.tiles['light'][xs,ys]
-        name = NAMES[player.gamemap.tiles[xs,ys][5]]
+        name = NAMES[TILES[player.gamemap.tiles[xs,ys]]["name"]]
         fg = color.grey
         console.print(x+3,y,chr(tile[0]),tuple(tile[1]),tuple(tile[2]))
 
@@ -0,0 +1,100 @@
+"""Marked up text laid out once, then written onto consoles in one go."""
+from __future__ import annotations
+
+from typing import Iterable, NamedTuple, Tuple, TYPE_CHECKING
+
+import functools
+
+import numpy as np
+import tcod
+
+from game import color
+
+if TYPE_CHECKING:
+    from tcod import Console
+
+
+class Layout(NamedTuple):
+    """The cells some text prints to, relative to where it's printed."""
+    xs: np.ndarray
+    ys: np.ndarray
+    ch: np.ndarray
+    fg: np.ndarray
+    width: int
+    height: int
+
+    def print(self, console: Console, x: int, y: int) -> None:
+        """Print onto an order "F" console with the top left at x,y, leaving backgrounds alone."""
+        xs, ys, ch, fg = self.xs + x, self.ys + y, self.ch, self.fg
+        if x < 0 or y < 0 or x + self.width > console.width or y + self.height > console.height:
+            inside = (xs >= 0) & (xs < console.width) & (ys >= 0) & (ys < console.height)
+            xs, ys, ch, fg = xs[inside], ys[inside], ch[inside], fg[inside]
+        tiles = console.tiles_rgb
+        tiles["ch"][xs, ys] = ch
+        tiles["fg"][xs, ys] = fg
+
+
+def lay_out(cells: Iterable[Tuple[int, int, str, Tuple[int, int, int]]], lines: int) -> Layout:
+    """A Layout from (x, y, character, color) cells and the number of lines they span."""
+    cells = list(cells)
+    xs = np.array([c[0] for c in cells], dtype=np.intp)
+    ys = np.array([c[1] for c in cells], dtype=np.intp)
+    ch = np.array([ord(c[2]) for c in cells], dtype=np.int32)
+    fg = np.array([c[3] for c in cells], dtype=np.uint8).reshape(-1, 3)
+    for a in (xs, ys, ch, fg):
+        # shared by everything that prints the same text
+        a.flags.writeable = False
+    return Layout(xs, ys, ch, fg, int(xs.max()) + 1 if cells else 0, lines)
+
+
+# help pages, a handful of fixed texts
+@functools.lru_cache(maxsize=16)
+def multicolor(text: str, colors: Tuple[Tuple[int, int, int], ...]) -> Layout:
+    """Text in grey, with $titles$ in offwhite and each ^span^ in the next of `colors`."""
+    cells = []
+    wx = wy = 0
+    fg = color.grey
+    fg_index = 0
+
+    for c in text:
+        if c == "\n":
+            wy += 1
+            wx = 0
+            continue
+        if c == "$":
+            fg = color.offwhite if fg == color.grey else color.grey
+            continue
+        if c == "^":
+            if fg == color.grey:
+                fg = colors[fg_index]
+                fg_index += 1
+            else:
+                fg = color.grey
+            continue
+        cells.append((wx, wy, c, fg))
+        wx += 1
+
+    return lay_out(cells, wy + 1)
+
+
+# texts change as items are identified and stats move, so only keep recent ones
+@functools.lru_cache(maxsize=64)
+def word_wrapped(parts: Tuple[tuple, ...], width: int) -> Layout:
+    """(text, color) parts wrapped word by word to `width`."""
+    cells = []
+    wx = wy = 0
+    for text, fg in parts:
+        for word in str(text).split():
+            if wx + len(word) > width:
+                wx = 0
+                wy += 1
+            cells += ((wx + i, wy, c, fg) for i, c in enumerate(word))
+            wx += len(word) + 1
+
+    return lay_out(cells, wy + 1)
+
+
+@functools.lru_cache(maxsize=64)
+def height(text: str, width: int, max_height: int) -> int:
+    """Console.get_height_rect for a rect that fits on the console."""
+    return tcod.Console(width, max_height, order="F").get_height_rect(0, 0, width, max_height, text)
@@ -0,0 +1,197 @@
+"""Versioned save container: pickle protocol 5 with out-of-band buffers and a pluggable codec.
+
+A save holds named sections, each pickled on its own so a reader can load
+just the ones it needs. Layout, little-endian:
+
+    magic          4 bytes  b"CHRL"
+    version        uint16   FORMAT_VERSION
+    codec          uint8    index into CODECS
+    level          uint8    compression level the file was written with
+    section count  uint32
+    per section:
+        name length  uint8, then the utf-8 name
+        chunk count  uint32   the pickle stream, then one chunk per out-of-band buffer
+        chunk sizes  uint64 * chunk count, compressed sizes
+    chunks, section by section
+
+Large contiguous buffers (the numpy arrays on GameMap) are written as their
+own chunks instead of being copied into the pickle stream. Version 1 files,
+which held a single object, read as one MAIN section, and so do files
+without the magic, the old lzma-compressed pickles.
+"""
+from __future__ import annotations
+
+import io
+import lzma
+import os
+import pickle
+import struct
+import zlib
+from typing import Callable, Dict, Iterable, List
+
+MAGIC = b"CHRL"
+FORMAT_VERSION = 2
+
+HEADER = struct.Struct("<4sHBBI")
+COUNT = struct.Struct("<I")
+CHUNK_SIZE = struct.Struct("<Q")
+
+# section name for files holding a single object
+MAIN = "main"
+
+# name -> (compress(data, level), decompress(data))
+CODECS = {
+    "none": (lambda data, level: bytes(data), lambda data: data),
+    "zlib": (lambda data, level: zlib.compress(data, level), zlib.decompress),
+    "lzma": (lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+}
+CODEC_IDS = list(CODECS)
+
+DEFAULT_CODEC = ("zlib", 1)
+
+
+class SaveFormatError(Exception):
+    """The data isn't a save this version can read."""
+
+
+def snapshot(obj, previous: List[bytes] = None, persistent_id: Callable = None) -> List[bytes]:
+    """Pickle `obj` into the chunks of a section, without compressing them.
+
+    The result shares no memory with `obj`, so it can be encoded on another
+    thread while the game keeps changing. Buffers identical to the ones in
+    the `previous` snapshot reuse its chunks instead of being copied again.
+    `persistent_id` lets the section refer to objects pickled elsewhere.
+    """
+    buffers: List[pickle.PickleBuffer] = []
+    stream = io.BytesIO()
+    pickler = pickle.Pickler(stream, protocol=5, buffer_callback=buffers.append)
+    if persistent_id:
+        pickler.persistent_id = persistent_id
+    pickler.dump(obj)
+
+    chunks = [stream.getvalue()]
+    for i, b in enumerate(buffers, 1):
+        raw = b.raw()
+        if previous and i < len(previous) and previous[i] == raw:
+            chunks.append(previous[i])
+        else:
+            chunks.append(bytes(raw))
+    return chunks
+
+
+def decode(chunks: List[bytes], persistent_load: Callable = None):
+    """Rebuild an object from uncompressed section chunks."""
+    # bytearrays, so arrays rebuilt on top of them are writable and unshared
+    unpickler = pickle.Unpickler(io.BytesIO(chunks[0]), buffers=[bytearray(c) for c in chunks[1:]])
+    if persistent_load:
+        unpickler.persistent_load = persistent_load
+    return unpickler.load()
+
+
+def encode(sections: Dict[str, List[bytes]], codec: str = None, level: int = None) -> bytes:
+    """Compress section chunks and pack them behind a header, with DEFAULT_CODEC unless a codec is given."""
+    if codec is None:
+        codec, level = DEFAULT_CODEC
+    elif level is None:
+        level = DEFAULT_CODEC[1] if codec == DEFAULT_CODEC[0] else 6
+
+    compress = CODECS[codec][0]
+    table = [HEADER.pack(MAGIC, FORMAT_VERSION, CODEC_IDS.index(codec), level, len(sections))]
+    data = []
+    for name, chunks in sections.items():
+        chunks = [compress(c, level) for c in chunks]
+        name = name.encode()
+        table += [bytes([len(name)]), name, COUNT.pack(len(chunks))]
+        table += [CHUNK_SIZE.pack(len(c)) for c in chunks]
+        data += chunks
+    return b"".join(table + data)
+
+
+class Section:
+    """One section of a save, still compressed until it is loaded."""
+
+    def __init__(self, chunks: List[bytes], decompress: Callable):
+        self.chunks = chunks
+        self.decompress = decompress
+
+    def load(self, persistent_load: Callable = None):
+        return decode([self.decompress(c) for c in self.chunks], persistent_load)
+
+
+class LegacySection(Section):
+    """A whole save from before the container: lzma over a default protocol pickle."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def load(self, persistent_load: Callable = None):
+        return pickle.loads(lzma.decompress(self.data))
+
+
+def read_sections(f, names: Iterable[str] = None) -> Dict[str, Section]:
+    """Read the sections in `names` (all of them by default) from a binary file.
+
+    Only the header and the requested sections' bytes are read.
+    """
+    if f.read(len(MAGIC)) != MAGIC:
+        f.seek(0)
+        return {MAIN: LegacySection(f.read())}
+
+    f.seek(0)
+    magic, version, codec_id, level, count = HEADER.unpack(f.read(HEADER.size))
+    if version > FORMAT_VERSION or codec_id >= len(CODEC_IDS):
+        raise SaveFormatError(f"Unsupported save format {version} / codec {codec_id}")
+    decompress = CODECS[CODEC_IDS[codec_id]][1]
+
+    def chunk_sizes(n):
+        return [CHUNK_SIZE.unpack(f.read(CHUNK_SIZE.size))[0] for _ in range(n)]
+
+    if version == 1:
+        # a single object, with its chunk count where the section count is now
+        table = [(MAIN, chunk_sizes(count))]
+    else:
+        table = []
+        for _ in range(count):
+            name = f.read(f.read(1)[0]).decode()
+            table.append((name, chunk_sizes(COUNT.unpack(f.read(COUNT.size))[0])))
+
+    sections = {}
+    offset = f.tell()
+    for name, sizes in table:
+        if names is None or name in names:
+            f.seek(offset)
+            sections[name] = Section([f.read(size) for size in sizes], decompress)
+        offset += sum(sizes)
+    return sections
+
+
+def dumps(obj, codec: str = None, level: int = None) -> bytes:
+    return encode({MAIN: snapshot(obj)}, codec, level)
+
+
+def loads(data: bytes):
+    return read_sections(io.BytesIO(data))[MAIN].load()
+
+
+def write_atomic(filename: str, data: bytes) -> None:
+    """Write `data` to a temp file and rename it over `filename`, so a crash never leaves half a save."""
+    temp = filename + ".tmp"
+    with open(temp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, filename)
+
+
+def save(obj, filename: str, codec: str = None, level: int = None) -> None:
+    write_atomic(filename, dumps(obj, codec, level))
+
+
+def load(filename: str):
+    with open(filename, "rb") as f:
+        return read_sections(f, (MAIN,))[MAIN].load()
+
+
+def load_sections(filename: str, names: Iterable[str] = None) -> Dict[str, Section]:
+    with open(filename, "rb") as f:
+        return read_sections(f, names)
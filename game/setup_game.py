@@ -3,8 +3,10 @@ from __future__ import annotations
 
 import math
 import copy
-import lzma
-import pickle
+import functools
+import json
+import os
+import threading
 import traceback
 from typing import Optional
 import random
@@ -12,31 +14,57 @@ import random
 import tcod
 
 from game.engine import Engine
-from game import color, entity_factories, exceptions, input_handlers
+from game import autosave, color, entity_factories, exceptions, input_handlers, journal, savefile
 from game.game_map import GameWorld
 
 import utils
 
 
-# Load the background image and remove the alpha channel.
-background_image = tcod.image.load(utils.get_resource("menu_background.png"))[:, :, :3]
+@functools.lru_cache(maxsize=None)
+def menu_background(width: int, height: int) -> tcod.Console:
+    """The menu's background image in semigraphics, loaded and converted the first time it's needed."""
+    # Load the background image and remove the alpha channel.
+    image = tcod.image.load(utils.get_resource("menu_background.png"))[:, :, :3]
+    console = tcod.Console(width, height, order="F")
+    console.draw_semigraphics(image, 0, 0)
+    return console
+
+
+def generation_workers() -> int:
+    """How many processes generate each floor's candidate layouts; 0 for serially.
+
+    A floor takes about a tenth of a second to generate on average, so a
+    process pool only pays off when its workers really run side by side.
+    With a single usable core it's all overhead (pickling the engine and
+    starting processes), so generation stays serial. Otherwise the pool is
+    started for the floor and shut down once it's chosen; a run only
+    generates its first floor, so there's nothing to keep it for.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cores = len(os.sched_getaffinity(0))
+    else:
+        cores = os.cpu_count() or 1
+    return min(4, cores) if cores > 1 else 0
+
 
 def new_game(meta) -> Engine:
     """Return a brand new game session as an Engine instance."""
 
     # If there's an existing save, log it as a game over
     try:
-        engine = load_game(utils.get_resource("savegame.sav"))
+        header, history = load_history(utils.get_resource("savegame.sav"))
     except FileNotFoundError:
-        engine = None
+        history = None
+    except exceptions.ReplayError:
+        # the journal has gone its own way; log the run as of the last full save
+        traceback.print_exc()
+        header, history = load_history(utils.get_resource("savegame.sav"), replay=False)
 
-    if engine:
-        # make sure there's meta continuity when logging the run
-        engine.meta = meta
-        engine.history.append(("lose","scumming",engine.turn_count))
-        engine.log_run()
-        meta = engine.meta
+    if history is not None:
+        history.append(("lose","scumming",header["turn_count"]))
+        meta.log_run(history)
 
+    # the engine's camera shows as much of the map as fits left of the HUD
     map_width = 57
     map_height = 50
 
@@ -55,7 +83,8 @@ def new_game(meta) -> Engine:
         engine=engine,
         map_width=map_width,
         map_height=map_height,
-        game_mode=game_mode
+        game_mode=game_mode,
+        generation_workers=generation_workers()
     )
 
     engine.game_world.generate_floor()
@@ -65,18 +94,60 @@ def new_game(meta) -> Engine:
     engine.message_log.add_message(f"You {rch} up from the plumbing, catching a lone human unawares. Now's your chance!",color.offwhite)
     engine.message_log.add_message("Press ? for controls + info.",color.purple)
 
+    # first checkpoint, so the journal always has a save to replay onto
+    engine.save_file = utils.get_resource("savegame.sav")
+    engine.checkpoint()
+
     return engine
 
-def load_game(filename: str) -> Engine:
-    """Load an Engine instance from a file."""
-    with open(filename, "rb") as f:
-        engine = pickle.loads(lzma.decompress(f.read()))
+def load_game(filename: str, replay: bool = True) -> Engine:
+    """Load an Engine instance from a file and, unless told not to, replay its journal."""
+    # a queued autosave would replace the file and prune the journal under us
+    autosave.autosaver.flush()
+    sections = savefile.load_sections(filename)
+    if savefile.MAIN in sections:
+        # saves from before they were split into sections
+        engine = sections[savefile.MAIN].load()
+    else:
+        engine = sections["world"].load()
+        engine.history = sections["history"].load()
+        engine.defer_message_log(sections["message_log"])
     assert isinstance(engine, Engine)
+    engine.save_file = filename
+    # visibility isn't saved; replay needs it as it was
+    engine.update_fov()
+    if replay:
+        journal.replay(engine, filename)
     return engine
 
+def load_header(filename: str) -> dict:
+    """Read just the header of a save."""
+    autosave.autosaver.flush()
+    sections = savefile.load_sections(filename, ("header",))
+    if "header" not in sections:
+        return load_game(filename).save_header
+    return sections["header"].load()
+
+def load_history(filename: str, replay: bool = True):
+    """Read the header and run history of a save, without the world when possible.
+
+    Actions journaled since the save was written may have changed both, so
+    then the whole game has to be loaded and replayed. That skips the world
+    only when the journal is empty: after a clean quit, which checkpoints.
+    A crash, or any action after an autosave, leaves entries to replay.
+    Without `replay`, they are left out.
+    """
+    autosave.autosaver.flush()
+    if not replay or not journal.has_entries(filename):
+        sections = savefile.load_sections(filename, ("header","history"))
+        if "header" in sections:
+            return sections["header"].load(), sections["history"].load()
+    engine = load_game(filename, replay)
+    return engine.save_header, engine.history
+
 def load_settings(filename: str) -> Meta:
-    with open(filename, "rb") as f:
-        meta = pickle.loads(lzma.decompress(f.read()))
+    """Load a Meta pickled in the old savemeta.sav format."""
+    meta = savefile.load(filename)
     assert isinstance(meta, Meta)
     return meta
 
@@ -85,21 +156,19 @@ class MainMenu(input_handlers.BaseEventHandler):
 
     def __init__(self):
         try:
-            self.engine = load_game(utils.get_resource("savegame.sav"))
+            self.save_header = load_header(utils.get_resource("savegame.sav"))
         except FileNotFoundError:
-            self.engine = None
+            self.save_header = None
+        except Exception:
+            # a save that won't load still lets the menu open, just without continue
+            traceback.print_exc()
+            self.save_header = None
 
-        try:
-            self.meta = Meta(load_settings(utils.get_resource("savemeta.sav")))
-        except FileNotFoundError:
-            self.meta = Meta()
-
-        if self.engine:
-            self.engine.meta = self.meta
+        self.meta = Meta()
 
     def on_render(self, console: tcod.Console) -> None:
         """Render the main menu on a background image."""
-        console.draw_semigraphics(background_image, 0, 0)
+        menu_background(console.width, console.height).blit(console)
 
         console.print(
             console.width - 14,
@@ -113,7 +182,7 @@ class MainMenu(input_handlers.BaseEventHandler):
         for i, text in enumerate(
             ["(c)ontinue", "(n)ew game", "(o)ptions", "(q)uit"]
         ):
-            if i == 0 and not self.engine:
+            if i == 0 and not self.save_header:
                 continue
             console.print(
                 65,
@@ -132,12 +201,18 @@ class MainMenu(input_handlers.BaseEventHandler):
         if event.sym in (tcod.event.K_q, tcod.event.K_ESCAPE):
             raise SystemExit()
         elif event.sym == tcod.event.K_c:
-            if self.engine:
-                return input_handlers.MainGameEventHandler(self.engine)
+            if self.save_header:
+                try:
+                    engine = load_game(utils.get_resource("savegame.sav"))
+                except exceptions.ReplayError:
+                    traceback.print_exc()
+                    return input_handlers.PopupMessage(self, "The saved game couldn't be restored.")
+                engine.meta = self.meta
+                return input_handlers.MainGameEventHandler(engine)
             else:
                 return input_handlers.PopupMessage(self, "No saved game to load.")
         elif event.sym == tcod.event.K_n:
-            if self.engine:
+            if self.save_header:
                 return input_handlers.Confirm(parent=self,callback=self.start_new_game,prompt="Start a new game? Your existing save will be overwritten and marked as a loss.")
             else: return self.start_new_game()
         elif event.sym == tcod.event.K_o:
@@ -158,7 +233,7 @@ class SubMenu(input_handlers.BaseEventHandler):
         return None
 
     def on_render(self, console:tcod.Console) -> None:
-        #console.draw_semigraphics(background_image, 0, 0)
+        #menu_background(console.width, console.height).blit(console)
         console.print(7,47,"(ESC) to go back")
 
     
@@ -191,25 +266,73 @@ class OptionsMenu(SubMenu):
 
 
 class Meta():
+    """Player settings, plus the log of past runs.
+
+    Settings live in a small JSON file, written shortly after the last change
+    instead of on every one. Each change serializes the settings on the
+    thread that made it; the save timer only writes the latest of them out,
+    and a lock keeps it and flush from writing at once. The timer isn't a
+    daemon, so a pending write still lands when the game exits. Runs are
+    appended to a JSON lines file, one run per line, and only read back when
+    old_runs is used.
+    """
     version = "0.0"
 
-    _fullscreen = True
-    _do_combat_confirm = True
-    _tutorials = True
-    _difficulty = "easy"
-    old_runs = []
-    tutorial_events = []
+    settings_file = utils.get_resource("settings.json")
+    runs_file = utils.get_resource("runs.jsonl")
+    # where settings and runs were pickled together before
+    legacy_file = utils.get_resource("savemeta.sav")
 
-    def __init__(self, old_meta=None):
-        def override(name):
-            if hasattr(old_meta,name):
-                setattr(self,name,getattr(old_meta,name))
+    # seconds to wait for more changes before writing settings
+    save_delay = 0.5
 
-        if old_meta:
-            for i in ['_fullscreen','_do_combat_confirm','_tutorials','_difficulty','old_runs','tutorial_events']:
-                override(i)
+    # settings file key -> attribute
+    settings = {
+        'fullscreen': '_fullscreen',
+        'do_combat_confirm': '_do_combat_confirm',
+        'tutorials': '_tutorials',
+        'difficulty': '_difficulty',
+        'tutorial_events': 'tutorial_events',
+    }
 
-        self.save()
+    def __init__(self):
+        self._fullscreen = True
+        self._do_combat_confirm = True
+        self._tutorials = True
+        self._difficulty = "easy"
+        self.tutorial_events = []
+        self._old_runs = None
+        self._save_timer = None
+        # settings serialized by the last save(), for the timer to write
+        self._pending = None
+        self._save_lock = threading.Lock()
+
+        try:
+            with open(self.settings_file) as f:
+                settings = json.load(f)
+        except FileNotFoundError:
+            self.migrate()
+        except ValueError:
+            traceback.print_exc()
+        else:
+            for key, attr in self.settings.items():
+                if key in settings:
+                    setattr(self, attr, settings[key])
+
+    def migrate(self):
+        """Split an old savemeta.sav into the settings file and the run log."""
+        try:
+            legacy = load_settings(self.legacy_file)
+        except FileNotFoundError:
+            return
+
+        # the old class-level defaults weren't pickled, so read the instance dict only
+        for attr in self.settings.values():
+            if attr in legacy.__dict__:
+                setattr(self, attr, legacy.__dict__[attr])
+        for history in legacy.__dict__.get('old_runs', []):
+            self.log_run(history)
+        self.flush()
 
     @property
     def do_combat_confirm(self):
@@ -247,15 +370,60 @@ class Meta():
         self._difficulty = new_val
         self.save()
 
+    @property
+    def old_runs(self):
+        """Every logged run's history, read from the run log on first use."""
+        if self._old_runs is None:
+            self._old_runs = []
+            try:
+                with open(self.runs_file) as f:
+                    for line in f:
+                        try:
+                            self._old_runs.append([tuple(event) for event in json.loads(line)])
+                        except ValueError:
+                            # torn write from a crash mid-append
+                            continue
+            except FileNotFoundError:
+                pass
+        return self._old_runs
+
     def log_tutorial_event(self,event):
         self.tutorial_events.append(event)
         self.save()
 
     def log_run(self, history):
-        self.old_runs.append(history)
-        self.save()
+        with open(self.runs_file, "a") as f:
+            f.write(json.dumps([list(event) for event in history], default=str) + "\n")
+        if self._old_runs is not None:
+            self._old_runs.append([tuple(event) for event in history])
+
+    def encode_settings(self) -> bytes:
+        settings = {key: getattr(self, attr) for key, attr in self.settings.items()}
+        return json.dumps(settings).encode()
 
     def save(self):
-        save_data = lzma.compress(pickle.dumps(self))
-        with open(utils.get_resource("savemeta.sav"), "wb") as f:
-            f.write(save_data)
+        """Write settings soon, along with any other changes made before then."""
+        data = self.encode_settings()
+        with self._save_lock:
+            self._pending = data
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self.save_delay, self.write_pending)
+                self._save_timer.start()
+
+    def write_pending(self):
+        """Save timer callback: write the settings the last save() serialized."""
+        with self._save_lock:
+            data, self._pending = self._pending, None
+            self._save_timer = None
+            if data is not None:
+                savefile.write_atomic(self.settings_file, data)
+
+    def flush(self):
+        """Write settings now."""
+        data = self.encode_settings()
+        with self._save_lock:
+            timer, self._save_timer = self._save_timer, None
+            if timer:
+                timer.cancel()
+            self._pending = None
+            savefile.write_atomic(self.settings_file, data)
@@ -0,0 +1,64 @@
+"""In-memory ring of recent turn snapshots, for rewinding while debugging and for test fixtures."""
+from __future__ import annotations
+
+from collections import deque
+from typing import TYPE_CHECKING, List
+
+from game import savefile
+
+if TYPE_CHECKING:
+    from game.engine import Engine
+
+import utils
+
+
+class SnapshotRing:
+    """The last `maxlen` turns of an engine, as uncompressed save chunks.
+
+    Each snapshot is a pickle stream plus one chunk per map array. Arrays that
+    didn't change since the previous snapshot share its chunk instead of
+    being copied again.
+
+    With `spill`, every snapshot is also written as resources/snapshot_<turn>.sav
+    in the regular save format, and ones more than 20 turns old are pruned.
+    """
+
+    def __init__(self, maxlen: int = 20, spill: bool = False):
+        self.snapshots = deque(maxlen=maxlen)
+        self.spill = spill
+
+    def __len__(self) -> int:
+        return len(self.snapshots)
+
+    @property
+    def turns(self) -> List[int]:
+        return [turn for turn, chunks in self.snapshots]
+
+    def take(self, engine: Engine) -> None:
+        previous = self.snapshots[-1][1] if self.snapshots else None
+        chunks = savefile.snapshot(engine, previous)
+        self.snapshots.append((engine.turn_count, chunks))
+
+        if self.spill:
+            filename = utils.get_resource(f"snapshot_{engine.turn_count}.sav")
+            savefile.write_atomic(filename, savefile.encode({savefile.MAIN: chunks}))
+            utils.del_old_snapshots(engine.turn_count)
+
+    def restore(self, index: int = -1) -> Engine:
+        """A fresh copy of the engine as it was at snapshot `index`."""
+        turn, chunks = self.snapshots[index]
+        engine = savefile.decode(chunks)
+        engine.snapshots = self
+        engine.update_fov()
+        return engine
+
+    def rewind(self, steps: int = 1) -> Engine:
+        """Drop the newest `steps` snapshots and restore the one before them.
+
+        The engine comes back without meta; the caller hands it the live one.
+        """
+        if steps >= len(self.snapshots):
+            raise IndexError("Not that many snapshots to rewind")
+        for _ in range(steps):
+            self.snapshots.pop()
+        return self.restore()
@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 from typing import Tuple
 
 import numpy as np  # type: ignore
@@ -26,6 +28,8 @@ tile_dt = np.dtype(
 
 NAMES = []
 FLAVORS = []
+# tile records by id; the tile constants below are indexes into this
+TILES = []
 
 def new_tile(
     *,  # Enforce the use of keywords, so that parameter order doesn't matter.
@@ -35,8 +39,8 @@ def new_tile(
     light: Tuple[int, Tuple[int, int, int], Tuple[int, int, int]],
     name: int,
     flavor: int
-) -> np.ndarray:
-    """Helper function for defining individual tile types """
+) -> int:
+    """Helper function for defining individual tile types. Returns the new tile's id."""
 
     if name in NAMES:
         name = NAMES.index(name)
@@ -52,7 +56,52 @@ def new_tile(
 
     placeholder = None
 
-    return np.array((walkable, placeholder, transparent, dark, light, name, flavor), dtype=tile_dt)
+    TILES.append((walkable, placeholder, transparent, dark, light, name, flavor))
+    return len(TILES)-1
+
+
+class TileGrid:
+    """A map's tiles, stored as one uint8 tile id per cell.
+
+    Indexing with a position reads or writes ids. Indexing with a field name
+    ("walkable", "transparent", "light", "dark", ...) returns that field for
+    every cell, looked up from TILES once and cached until the next write.
+    """
+
+    def __init__(self, width: int, height: int, fill_value: int):
+        self.ids = np.full((width, height), fill_value=fill_value, dtype=np.uint8, order="F")
+        self.layers = {}
+
+    @classmethod
+    def from_records(cls, records: np.ndarray) -> TileGrid:
+        """Convert a grid of full tile_dt records, as saves used to store them."""
+        def key(record):
+            return (bool(record["walkable"]), bool(record["transparent"]), record["dark"].tobytes(), record["light"].tobytes(), int(record["name"]), int(record["flavor"]))
+        ids = {key(record): i for i, record in enumerate(TILES)}
+
+        grid = cls(*records.shape, fill_value=0)
+        for xy in np.ndindex(records.shape):
+            grid.ids[xy] = ids[key(records[xy])]
+        return grid
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            layer = self.layers.get(key)
+            if layer is None:
+                layer = self.layers[key] = TILES[key][self.ids]
+            return layer
+        return self.ids[key]
+
+    def __setitem__(self, key, value) -> None:
+        self.ids[key] = value
+        self.layers.clear()
+
+    def __getstate__(self):
+        return {"ids": self.ids}
+
+    def __setstate__(self, state) -> None:
+        self.ids = state["ids"]
+        self.layers = {}
 
 
 # SHROUD represents unexplored, unseen tiles
@@ -150,4 +199,6 @@ dismantled_bioscanner = new_tile(
     transparent=True,
     dark=(ord("╬"), (50,50,50), (25,0,25)),
     light=(ord("╬"), (200,75,75), (50,0,50))
-)
\ No newline at end of file
+)
+
+TILES = np.array(TILES, dtype=tile_dt)
@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
+import multiprocessing
 import traceback
 import warnings
 import tcod
 
 from game import color, exceptions
+from game.frame_scheduler import coalesce, scheduler
 from game.game_map import GameMap
 from game import input_handlers, setup_game
 
@@ -13,7 +15,7 @@ import utils
 def save_game(handler: input_handlers.BaseEventHandler, filename: str) -> None:
     """If the current event handler has an active Engine then save it."""
     if isinstance(handler, input_handlers.EventHandler):
-        handler.engine.save_as(filename)
+        handler.engine.checkpoint(filename)
 
 def toggle_fullscreen(context: tcod.context.Context) -> None:
     """Toggle a context window between fullscreen and windowed modes."""
@@ -52,14 +54,24 @@ def main() -> None:
                 toggle_fullscreen(context)
             try:
                 while True:
-                    root_console.clear()
-                    handler.on_render(console=root_console)
-                    context.present(root_console)
+                    if scheduler.frame_due:
+                        root_console.clear()
+                        handler.on_render(console=root_console)
+                        context.present(root_console)
+                        scheduler.drawn()
+                    elif scheduler.tick_due:
+                        scheduler.tick()
+                        handler.on_tick(console=root_console)
+                        context.present(root_console)
+                        scheduler.drawn()
 
                     try:
-                        for event in tcod.event.wait(None):
+                        for event in coalesce(tcod.event.wait(scheduler.timeout())):
                             context.convert_event(event)
-                            handler = handler.handle_events(event)
+                            scheduler.note(event)
+                            previous, handler = handler, handler.handle_events(event)
+                            if handler is not previous:
+                                scheduler.invalidate()
 
                     except exceptions.NewGame as e:
                         root_console.clear()
@@ -92,10 +104,10 @@ def main() -> None:
             except SystemExit:  # Save and quit.
                 save_game(handler, utils.get_resource("savegame.sav"))
                 raise
-            except BaseException:  # Save on any other unexpected exception.
-                save_game(handler, utils.get_resource("savegame.sav"))
-                raise
+            # Nothing to save on any other unexpected exception: the journal
+            # already holds every action since the last checkpoint.
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # level generation workers in frozen builds
     main()
\ No newline at end of file
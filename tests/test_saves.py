@@ -0,0 +1,143 @@
+"""Saving and loading a game gives back the game that was saved."""
+from __future__ import annotations
+
+import lzma
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from game import autosave, input_handlers
+from game.actions import WaitAction
+from game.game_map import EntitySet
+from game.message_log import MessageLog
+from game.setup_game import load_game, load_header
+from game.tile_types import TileGrid
+
+from benchmarks.common import new_game
+
+
+def actor_state(engine):
+    return sorted(
+        (
+            a.id, a.name, a.xy, a.is_alive, a.bump_index, a.vigor, a.last_peed,
+            type(a.ai).__name__,
+            dict(getattr(a.ai, "suspicions", {})),
+            list(getattr(a.ai, "found", [])),
+            sorted((time, room.name) for time, room in (a.schedule or {}).items()),
+            [type(s).__name__ for s in a.statuses],
+        )
+        for a in engine.game_map.actors
+    )
+
+
+class RoundTripTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = new_game(3)
+        for _ in range(20):
+            self.engine.perform_player_action(WaitAction(self.engine.player))
+        # what NPCs have noticed is run state, and has to survive a load
+        npc = next(a for a in self.engine.game_map.actors if hasattr(a.ai, "suspicions"))
+        npc.ai.suspicions["Bob"] = 30
+        npc.ai.found.append("Alice")
+        scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(scratch.cleanup)
+        self.filename = os.path.join(scratch.name, "savegame.sav")
+
+    def assert_same_game(self, loaded):
+        engine, gm = self.engine, loaded.game_map
+        self.assertEqual(loaded.turn_count, engine.turn_count)
+        self.assertTrue((gm.tiles.ids == engine.game_map.tiles.ids).all())
+        self.assertTrue((gm.explored == engine.game_map.explored).all())
+        self.assertTrue((gm.visible == engine.game_map.visible).all())
+        self.assertEqual(actor_state(loaded), actor_state(engine))
+        self.assertEqual([r.name for r in gm.rooms], [r.name for r in engine.game_map.rooms])
+        self.assertEqual(
+            [m.plain_text for m in loaded.message_log.messages],
+            [m.plain_text for m in engine.message_log.messages],
+        )
+
+    def test_round_trip(self):
+        self.engine.save_as(self.filename)
+        loaded = load_game(self.filename)
+        self.assert_same_game(loaded)
+
+    def test_derived_state_is_rebuilt(self):
+        self.engine.save_as(self.filename)
+        loaded = load_game(self.filename)
+        gm = loaded.game_map
+
+        self.assertTrue(gm.explored.flags.writeable and gm.tiles.ids.flags.writeable)
+        self.assertTrue(all(e.parent is gm for e in gm.entities))
+        self.assertTrue(all(m.parent is loaded.message_log for m in loaded.message_log.messages))
+        self.assertIsNone(loaded.meta)
+        self.assertEqual(loaded.mouse_location, (0, 0))
+        self.assertIsNotNone(loaded.camera)
+        for actor in gm.actors:
+            if actor.ai:
+                self.assertIsNone(actor.ai._intent)
+                self.assertIsNone(actor.ai.path)
+
+    def test_transient_state_stays_out(self):
+        engine = self.engine
+        self.assertNotIn("visible", engine.game_map.__getstate__())
+        for name in ("meta", "snapshots", "mouse_location", "camera", "_hud_panels"):
+            self.assertNotIn(name, engine.__getstate__())
+        for message in engine.message_log.messages:
+            self.assertNotIn("parent", message.__getstate__())
+        for actor in engine.game_map.actors:
+            self.assertNotIn("bumps", vars(actor))
+            self.assertNotIn("max_vigor", vars(actor))
+
+    def test_legacy_container(self):
+        # lzma over a plain pickle, as saves were written before game.savefile
+        with open(self.filename, "wb") as f:
+            f.write(lzma.compress(pickle.dumps(self.engine)))
+        self.assert_same_game(load_game(self.filename))
+
+
+class BaselineSaveTest(unittest.TestCase):
+    """A save written by the game before this save format, tile ids and the journal.
+
+    fixtures/baseline.sav was made with that tree: random.seed(7), new_game,
+    one WaitAction and the enemies' turn, then Engine.save_as.
+    """
+
+    fixture = os.path.join(os.path.dirname(__file__), "fixtures", "baseline.sav")
+
+    def setUp(self):
+        scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(scratch.cleanup)
+        self.filename = os.path.join(scratch.name, "savegame.sav")
+        shutil.copy(self.fixture, self.filename)
+
+    def test_load(self):
+        engine = load_game(self.filename)
+        gm = engine.game_map
+        self.assertEqual(engine.turn_count, 241)
+        self.assertTrue(engine.player.is_alive)
+        self.assertIsInstance(gm.tiles, TileGrid)
+        self.assertIsInstance(gm.entities, EntitySet)
+        self.assertIsInstance(engine.message_log, MessageLog)
+        self.assertTrue(engine.message_log.messages)
+        self.assertEqual(engine.journal_seq, 0)
+
+    def test_header(self):
+        header = load_header(self.filename)
+        self.assertEqual(header["turn_count"], 241)
+        self.assertTrue(header["alive"])
+
+    def test_journaled_action(self):
+        engine = load_game(self.filename)
+        self.assertTrue(input_handlers.EventHandler(engine).handle_action(WaitAction(engine.player)))
+        autosave.autosaver.flush()
+
+        loaded = load_game(self.filename)
+        self.assertEqual(loaded.turn_count, engine.turn_count)
+        self.assertEqual(loaded.journal_seq, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()